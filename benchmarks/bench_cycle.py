@@ -0,0 +1,230 @@
+"""
+定期チェック1回分のエンドツーエンド・ベンチマーク
+
+Discord にもフリカレにも接続せずに、CalendarMonitor.schedule_check を実際の処理経路
+（取得 → 解析 → 差分計算 → SQLite 書き込み → 通知の送信）のまま繰り返し実行する。
+
+- フリカレ: スタブサーバー（benchmarks/stub_server.py）が記録済みページ
+  （--fixtures のディレクトリ内の mem{ID}.html）または生成ページを返す
+- Discord: 送信内容を記録するだけのメモリ上の偽チャンネル
+- 毎回 --change-rate の割合のユーザーのページを変化させる
+
+サイクルごとに所要時間・処理段階ごとの時間・CPU時間・ピークRSS・送信した通知を表示する。
+1回目は全予定が新規のため、2回目以降（warm）の中央値を比較に使う。
+
+使い方:
+    python benchmarks/bench_cycle.py                              # 100人 x 3回
+    python benchmarks/bench_cycle.py --users 500 --events 80 --change-rate 0.1
+    python benchmarks/bench_cycle.py --budget 5                   # warm の中央値が5秒を超えたら終了コード 1
+
+※ スタブサーバーも同じプロセスで動くため、CPU時間とRSSにはその分も含まれる。
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import config  # noqa: E402
+import bot  # noqa: E402
+import fixtures  # noqa: E402
+from stub_server import start_stub_server  # noqa: E402
+
+FAKE_CHANNEL_ID = 1
+STAGES = ("fetch_http", "fetch_selenium", "parse", "diff", "notify")
+
+
+class FakeChannel:
+    """送信内容を記録するだけの通知チャンネル（--send-latency で API の応答時間を再現）"""
+
+    def __init__(self, send_latency: float):
+        self.id = FAKE_CHANNEL_ID
+        self.mention = "#bench"
+        self.send_latency = send_latency
+        self.messages = 0
+        self.embeds = 0
+
+    async def send(self, content=None, embeds=None, **kwargs):
+        if self.send_latency:
+            await asyncio.sleep(self.send_latency)
+        self.messages += 1
+        self.embeds += len(embeds or [])
+
+
+class FakeBot:
+    def __init__(self, channel: FakeChannel):
+        self.channel = channel
+
+    def get_channel(self, channel_id):
+        return self.channel if channel_id == self.channel.id else None
+
+    async def wait_until_ready(self):
+        pass
+
+
+def peak_rss_mb():
+    """プロセスのピークRSS（MB、計測できなければ None）"""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+    if bot.psutil is not None:
+        return bot.psutil.Process().memory_info().peak_wset / 1024 / 1024
+    return None
+
+
+def recorded_user_ids():
+    names = sorted(os.listdir(fixtures.FIXTURES_DIR)) if os.path.isdir(fixtures.FIXTURES_DIR) else []
+    return [name[3:-5] for name in names if name.startswith("mem") and name.endswith(".html")]
+
+
+def user_ids_for(n_users: int):
+    """記録済みページのユーザーを優先し、足りない分は生成ページのユーザーで補う"""
+    ids = recorded_user_ids()[:n_users]
+    generated = (str(100000 + i) for i in range(10 ** 6))
+    while len(ids) < n_users:
+        user_id = next(generated)
+        if user_id not in ids:
+            ids.append(user_id)
+    return ids
+
+
+def configure(args, base_url: str, workdir: str):
+    config.FREECALEND_BASE_URL = base_url
+    config.FETCH_BACKEND = args.backend
+    config.HTML_PARSER = args.parser
+    config.SCRAPER_POOL_SIZE = args.workers
+    config.NOTIFICATION_CHANNEL_ID = FAKE_CHANNEL_ID
+    # 待ち時間ではなく処理時間を測るため、アクセス・送信の頻度制限は外す
+    config.RATE_LIMIT_PER_MINUTE = 10 ** 9
+    config.RATE_LIMIT_BURST = 10 ** 6
+    config.NOTIFY_RATE_PER_MINUTE = 10 ** 9
+    config.NOTIFY_RATE_BURST = 10 ** 6
+    config.METRICS_PORT = None
+    bot.DATABASE_FILE = os.path.join(workdir, "freecal.db")
+    bot.USERS_FILE = os.path.join(workdir, "users.json")
+    bot.PREVIOUS_DATA_FILE = os.path.join(workdir, "previous_data.json")
+    bot.SCREENSHOTS_DIR = os.path.join(workdir, "screenshots")
+
+
+def seed_users(user_ids):
+    # イベントループの外で登録するため、データベースへの書き込みを直接呼ぶ
+    data_manager = bot.DataManager(bot.DATABASE_FILE)
+    added_at = datetime.now().isoformat(timespec='seconds')
+    for user_id in user_ids:
+        data_manager._insert_user(user_id, f"bench{user_id}", added_at)
+    data_manager.close()
+
+
+def stage_summary():
+    parts = []
+    for stage in STAGES:
+        histogram = bot.metrics.histogram("freecal_stage_seconds", stage=stage)
+        if histogram and histogram.count:
+            parts.append(f"{stage} {histogram.mean * 1000:.1f}ms")
+    return " ".join(parts)
+
+
+async def run_cycle(cog, app, user_ids, change_rate: float, rng: random.Random):
+    changed = rng.sample(user_ids, round(len(user_ids) * change_rate))
+    for user_id in changed:
+        app["revisions"][user_id] = app["revisions"].get(user_id, 0) + 1
+    for user_id in user_ids:
+        cog.scheduler._push(user_id, 0)
+
+    channel = cog.bot.channel
+    messages, embeds = channel.messages, channel.embeds
+    bot.metrics = bot.Metrics()
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    await cog.schedule_check.coro(cog)
+    return {
+        "wall": time.perf_counter() - started,
+        "cpu": time.process_time() - cpu_started,
+        "rss": peak_rss_mb(),
+        "changed": len(changed),
+        "messages": channel.messages - messages,
+        "embeds": channel.embeds - embeds,
+        "stages": stage_summary(),
+    }
+
+
+def print_cycle(number: int, result: dict):
+    rss = f"{result['rss']:.0f}MB" if result["rss"] is not None else "n/a"
+    print(
+        f"cycle {number:2d} wall={result['wall']:6.2f}s cpu={result['cpu']:6.2f}s peak_rss={rss:>6s} "
+        f"changed={result['changed']:4d} notify={result['embeds']:4d} embeds/{result['messages']:3d} msgs  "
+        f"{result['stages']}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="定期チェックのエンドツーエンド・ベンチマーク")
+    parser.add_argument("--users", type=int, default=100, help="監視ユーザー数")
+    parser.add_argument("--events", type=int, default=30, help="生成ページ1件あたりの予定件数")
+    parser.add_argument("--change-rate", type=float, default=0.2, help="毎回ページが変化するユーザーの割合")
+    parser.add_argument("--cycles", type=int, default=3, help="実行するチェック回数（1回目は初回取得）")
+    parser.add_argument("--latency", type=float, default=0.0, help="ページの応答遅延（秒）")
+    parser.add_argument("--send-latency", type=float, default=0.0, help="通知送信1回あたりの遅延（秒）")
+    parser.add_argument("--backend", default="http", choices=bot.FETCH_BACKENDS, help="取得方式")
+    parser.add_argument("--parser", default="lxml", choices=sorted(bot.HTML_EXTRACTORS), help="HTML解析方式")
+    parser.add_argument("--workers", type=int, default=3, help="同時取得ワーカー数")
+    parser.add_argument("--fixtures", default=fixtures.FIXTURES_DIR, help="記録済みページのディレクトリ")
+    parser.add_argument("--seed", type=int, default=0, help="変化させるユーザーを選ぶ乱数の種")
+    parser.add_argument("--budget", type=float, default=None, help="warm サイクルの所要時間の上限（秒）")
+    args = parser.parse_args()
+
+    # 取得・解析ごとのINFOログ（スタブサーバーのアクセスログを含む）を抑止
+    logging.getLogger().setLevel(logging.WARNING)
+    fixtures.FIXTURES_DIR = args.fixtures
+    user_ids = user_ids_for(args.users)
+    rng = random.Random(args.seed)
+
+    runner, base_url = await start_stub_server(n_events=args.events, latency=args.latency)
+    app = runner.app
+    with tempfile.TemporaryDirectory(prefix="freecal-bench-") as workdir:
+        configure(args, base_url, workdir)
+        seed_users(user_ids)
+        channel = FakeChannel(args.send_latency)
+        cog = bot.CalendarMonitor(FakeBot(channel))
+        cog.schedule_check.cancel()
+        print(
+            f"users={len(user_ids)} (recorded {len(recorded_user_ids())}) events={args.events} "
+            f"change_rate={args.change_rate} backend={args.backend} parser={args.parser} workers={args.workers}"
+        )
+        results = []
+        try:
+            for number in range(1, args.cycles + 1):
+                # 1回目は全員が初回取得なので、ページの変化は2回目から
+                result = await run_cycle(cog, app, user_ids, args.change_rate if number > 1 else 0, rng)
+                results.append(result)
+                print_cycle(number, result)
+        finally:
+            await cog.cog_unload()
+            await runner.cleanup()
+
+    warm = [result["wall"] for result in results[1:]]
+    if warm:
+        median = statistics.median(warm)
+        print(f"\nwarm median wall={median:.2f}s ({median / len(user_ids) * 1000:.1f}ms/user)")
+        if args.budget is not None and median > args.budget:
+            print(f"❌ warm サイクルの所要時間 {median:.2f}秒 が上限 {args.budget}秒 を超えました")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
\ No newline at end of file
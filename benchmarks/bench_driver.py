@@ -0,0 +1,119 @@
+"""
+Chrome取得処理のベンチマーク（変更前 / 変更後）
+
+ローカルのスタブサーバーに対して、以下の2通りの取得処理を比較する。
+- legacy:  normal読み込み・全リソース取得・body待機後に固定3秒待機（v7.0.0 の動作）
+- current: eager読み込み・画像/フォント等をブロック・ccexp 要素の安定を検知して終了
+
+1ページあたりの取得時間と、Chrome（レンダラー含む）のメモリ使用量を表示する。
+スクリーンショットは両方とも取得しない。
+
+使い方:
+    python benchmarks/bench_driver.py --pages 10 --events 40 --asset-latency 0.2
+
+※ Google Chrome が必要です。メモリ計測には psutil を使用します（未インストールなら省略）。
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import config  # noqa: E402
+import bot  # noqa: E402
+from selenium.webdriver.common.by import By  # noqa: E402
+from selenium.webdriver.support import expected_conditions as EC  # noqa: E402
+from selenium.webdriver.support.ui import WebDriverWait  # noqa: E402
+from stub_server import start_stub_server  # noqa: E402
+
+MODES = {
+    "legacy": {"PAGE_LOAD_STRATEGY": "normal", "BLOCK_PAGE_RESOURCES": False},
+    "current": {"PAGE_LOAD_STRATEGY": "eager", "BLOCK_PAGE_RESOURCES": True},
+}
+
+
+def legacy_fetch(scraper, driver, url: str) -> str:
+    driver.get(url)
+    WebDriverWait(driver, 20).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
+    time.sleep(3)
+    return driver.page_source
+
+
+def current_fetch(scraper, driver, url: str) -> str:
+    driver.get(url)
+    scraper._wait_for_schedule(driver)
+    return driver.page_source
+
+
+FETCHERS = {"legacy": legacy_fetch, "current": current_fetch}
+
+
+def run_mode(mode: str, urls) -> dict:
+    for key, value in MODES[mode].items():
+        setattr(config, key, value)
+    scraper = bot.FreecalendScraper(backend="selenium")
+    driver = scraper._create_driver()
+    fetch = FETCHERS[mode]
+    times, event_counts = [], []
+    try:
+        for user_id, url in urls:
+            started = time.perf_counter()
+            html = fetch(scraper, driver, url)
+            times.append(time.perf_counter() - started)
+            event_counts.append(len(scraper._parse_final(html, user_id)))
+        rss = bot.chrome_rss_mb(driver)
+    finally:
+        driver.quit()
+    return {"times": times, "events": event_counts, "rss": rss}
+
+
+def print_result(mode: str, result: dict):
+    times = result["times"]
+    rss = f"{result['rss']:.0f}MB" if result["rss"] is not None else "n/a"
+    print(
+        f"{mode:8s} pages={len(times):3d} "
+        f"mean={sum(times) / len(times):.2f}s "
+        f"p50={bot.percentile(times, 50):.2f}s p95={bot.percentile(times, 95):.2f}s "
+        f"chrome_rss={rss} events={sum(result['events'])}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Chrome取得処理のベンチマーク")
+    parser.add_argument("--pages", type=int, default=10, help="モードごとの取得ページ数")
+    parser.add_argument("--events", type=int, default=40, help="1ページあたりの予定件数")
+    parser.add_argument("--asset-latency", type=float, default=0.2, help="画像・CSS等の応答遅延（秒）")
+    parser.add_argument("--modes", default="legacy,current", help="比較するモード（カンマ区切り）")
+    args = parser.parse_args()
+
+    runner, base_url = await start_stub_server(n_events=args.events, asset_latency=args.asset_latency)
+    try:
+        # 半分は静的HTML、半分はJSで遅れて描画されるページ
+        urls = []
+        for i in range(args.pages):
+            user_id = f"{900000 + i}" if i % 2 else f"{100000 + i}"
+            urls.append((user_id, f"{base_url}/open/mem{user_id}/"))
+
+        loop = asyncio.get_running_loop()
+        results = {}
+        for mode in args.modes.split(","):
+            results[mode] = await loop.run_in_executor(None, run_mode, mode, urls)
+            print_result(mode, results[mode])
+
+        if "legacy" in results and "current" in results:
+            if results["legacy"]["events"] != results["current"]["events"]:
+                print("⚠️ 取得できた予定件数がモード間で一致しません")
+            before = sum(results["legacy"]["times"])
+            after = sum(results["current"]["times"])
+            print(f"合計取得時間: {before:.1f}s -> {after:.1f}s ({after / before * 100:.0f}%)")
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,142 @@
+"""
+HTML解析のベンチマークと差分検証
+
+1. 差分検証: 生成ページ・境界ケース、および記録済みページ（benchmarks/fixtures/mem{ID}.html）が
+   あればそれについて、lxml 方式と BeautifulSoup 方式（v7.0.0 までの方式）の解析結果が完全に一致する
+   ことを確認する。不一致があれば終了コード 1 で終了する。
+   リポジトリには実際のフリカレのページを含めていない（個人の予定を含むため）。記録済みページが無い場合の
+   検証は fixtures.render_calendar_page() の生成ページと境界ケースのみで、実際のページの構造の違いは
+   確認できない。デプロイ前には、匿名化した実際のページを benchmarks/fixtures/ に置いて実行すること。
+2. ベンチマーク: 予定件数ごとに、1ページあたりの解析時間とピークメモリを表示する。
+
+使い方:
+    python benchmarks/bench_parse.py                    # 検証 + ベンチマーク
+    python benchmarks/bench_parse.py --verify-only      # 検証のみ（デプロイ前チェック用）
+    python benchmarks/bench_parse.py --sizes 10,100,1000 --repeat 20
+"""
+
+import argparse
+import glob
+import logging
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import bot  # noqa: E402
+from fixtures import FIXTURES_DIR, render_calendar_page  # noqa: E402
+
+PARSERS = ("bs4", "lxml")
+
+# 解析結果が変わりやすい境界ケース
+EDGE_CASE_PAGES = {
+    "nested_tags": """<html><head><title> フリカレ <b>x</b> </title></head><body>
+        <div id="ccexp-1-2099-1-2"><span>21:00</span> <a href="#">観戦</a>&nbsp;<br>延長あり</div>
+        <div id="ccexp-1-2099-1-3"><div><div>10:00 会議</div></div></div></body></html>""",
+    "comments_and_scripts": """<html><title>t</title><body>
+        <div id="ccexp-1-2099-2-1">12:00 <!-- 非表示 -->ランチ<script>var x = 1;</script><style>.a{}</style></div>
+        </body></html>""",
+    "legacy_id_format": """<html><title>t</title><body>
+        <div id="ccexp-2099-3-4-1">終日の予定</div><div id="ccexp-2099-3-4-2">9:05 朝会</div>
+        <div id="ccexp-bad-id">壊れたID</div><div id="ccexp-1-2099-13-40">不正な日付</div></body></html>""",
+    "whitespace_only": """<html><title>t</title><body>
+        <div id="ccexp-1-2099-4-1">  &nbsp; </div><div id="ccexp-1-2099-4-2">21:00</div></body></html>""",
+    "no_title_no_events": "<html><body><p>empty</p></body></html>",
+    "empty": "",
+}
+
+
+def iter_verification_pages(sizes):
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, "mem*.html"))):
+        user_id = os.path.basename(path)[3:-5]
+        with open(path, 'r', encoding='utf-8') as f:
+            yield f"recorded:{user_id}", user_id, f.read()
+    for size in sizes:
+        user_id = f"{200000 + size}"
+        yield f"generated:{size}", user_id, render_calendar_page(user_id, n_events=size, days=400)
+    for name, html in EDGE_CASE_PAGES.items():
+        yield f"edge:{name}", "1", html
+
+
+def verify(scraper, sizes) -> bool:
+    """両方式の抽出結果と解析結果が一致するかを確認する"""
+    ok = True
+    recorded = 0
+    for name, user_id, html in iter_verification_pages(sizes):
+        recorded += name.startswith("recorded:")
+        extracted = {parser: bot.HTML_EXTRACTORS[parser](html) for parser in PARSERS}
+        parsed = {parser: scraper._parse_final(html, user_id, parser=parser) for parser in PARSERS}
+        same_extract = extracted["bs4"] == extracted["lxml"]
+        same_events = parsed["bs4"] == parsed["lxml"]
+        status = "OK" if same_extract and same_events else "MISMATCH"
+        print(f"[{status:8s}] {name:32s} events={len(parsed['lxml'])}")
+        if status != "OK":
+            ok = False
+            for (bs4_item, lxml_item) in zip(extracted["bs4"][1], extracted["lxml"][1]):
+                if bs4_item != lxml_item:
+                    print(f"    bs4 : {bs4_item!r}\n    lxml: {lxml_item!r}")
+                    break
+            if extracted["bs4"][0] != extracted["lxml"][0]:
+                print(f"    title bs4={extracted['bs4'][0]!r} lxml={extracted['lxml'][0]!r}")
+    if not recorded:
+        print(
+            "※ 記録済みページ（benchmarks/fixtures/mem[ID].html）が無いため、生成ページと境界ケースのみで検証しました。"
+            "実際のフリカレのページでは未検証です。"
+        )
+    return ok
+
+
+def measure(scraper, parser: str, user_id: str, html: str, repeat: int):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        scraper._parse_final(html, user_id, parser=parser)
+        times.append(time.perf_counter() - started)
+    tracemalloc.start()
+    scraper._parse_final(html, user_id, parser=parser)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(times), peak
+
+
+def benchmark(scraper, sizes, repeat: int):
+    print(f"\n{'events':>7s} {'page':>8s} " + " ".join(f"{p + ' time':>12s} {p + ' peak':>11s}" for p in PARSERS) + "  speedup")
+    for size in sizes:
+        user_id = f"{300000 + size}"
+        html = render_calendar_page(user_id, n_events=size, days=400)
+        results = {parser: measure(scraper, parser, user_id, html, repeat) for parser in PARSERS}
+        cols = " ".join(
+            f"{results[p][0] * 1000:10.2f}ms {results[p][1] / 1024:9.0f}KB" for p in PARSERS
+        )
+        speedup = results["bs4"][0] / results["lxml"][0] if results["lxml"][0] else 0
+        print(f"{size:7d} {len(html) / 1024:6.0f}KB {cols}  x{speedup:.1f}")
+    print("\n※ peak は tracemalloc による Python 側の確保量（libxml2 内部の確保は含まない）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTML解析のベンチマークと差分検証")
+    parser.add_argument("--sizes", default="10,50,200,1000", help="予定件数（カンマ区切り）")
+    parser.add_argument("--repeat", type=int, default=10, help="1ケースあたりの計測回数")
+    parser.add_argument("--verify-only", action="store_true", help="差分検証のみ実行する")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    # 解析ごとのINFOログを抑止
+    bot.logger.setLevel(logging.CRITICAL)
+    scraper = bot.FreecalendScraper(backend="http")
+
+    ok = verify(scraper, sizes)
+    if not args.verify_only:
+        benchmark(scraper, sizes, args.repeat)
+    if not ok:
+        print("\n❌ 解析結果が一致しないページがあります")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,129 @@
+"""
+取得ワーカー（python bot.py --worker）のスケールアウト・ベンチマーク
+
+スタブサーバー（benchmarks/stub_server.py）に対して、同じデータベースを共有する取得ワーカーを
+--processes で指定した数ずつ起動し、全ユーザーのチェックが終わるまでの時間を比べる。
+各ワーカーは --drain 付きで動き、借りられるユーザーが無くなると終了する。
+
+ワーカー数ごとに新しいデータベースを作り、所要時間・1秒あたりのチェック人数・1プロセス時との比、
+results テーブルに書かれた結果の件数（同じユーザーを二重にチェックしていないか）を表示する。
+
+使い方:
+    python benchmarks/bench_workers.py                            # 200人、ワーカー 1, 2, 4
+    python benchmarks/bench_workers.py --users 500 --processes 1 2 4 8 --latency 0.2
+
+※ 各ワーカーの起動（bot のインポート）にかかる時間も所要時間に含まれる。
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import config  # noqa: E402
+import bot  # noqa: E402
+import bench_cycle  # noqa: E402
+from stub_server import start_stub_server  # noqa: E402
+
+
+def run_child(args):
+    """子プロセス: 取得ワーカーを1つ動かし、チェックした人数を表示して終了する"""
+    logging.getLogger().setLevel(logging.WARNING)
+    bench_cycle.configure(args, args.base_url, args.workdir)
+    config.LEASE_BATCH_SIZE = args.batch
+    worker = bot.ShardWorker(args.worker_id, drain=True)
+    asyncio.run(worker.run())
+    print(worker.checked)
+
+
+async def run_workers(args, base_url: str, user_ids, processes: int) -> dict:
+    with tempfile.TemporaryDirectory(prefix="freecal-bench-") as workdir:
+        bench_cycle.configure(args, base_url, workdir)
+        bench_cycle.seed_users(user_ids)
+
+        started = time.perf_counter()
+        children = [
+            await asyncio.create_subprocess_exec(
+                sys.executable, os.path.abspath(__file__), "--child",
+                "--base-url", base_url, "--workdir", workdir, "--worker-id", f"bench-{number}",
+                "--workers", str(args.workers), "--batch", str(args.batch),
+                "--backend", args.backend, "--parser", args.parser,
+                stdout=asyncio.subprocess.PIPE,
+            )
+            for number in range(1, processes + 1)
+        ]
+        outputs = await asyncio.gather(*(child.communicate() for child in children))
+        wall = time.perf_counter() - started
+
+        conn = sqlite3.connect(bot.DATABASE_FILE)
+        results, distinct = conn.execute("SELECT COUNT(*), COUNT(DISTINCT user_id) FROM results").fetchone()
+        conn.close()
+    per_worker = [int(stdout.split()[-1]) if stdout.split() else 0 for stdout, _ in outputs]
+    return {
+        "processes": processes,
+        "wall": wall,
+        "results": results,
+        "distinct": distinct,
+        "per_worker": per_worker,
+        "failed": sum(1 for child in children if child.returncode),
+    }
+
+
+async def compare(args):
+    logging.getLogger().setLevel(logging.WARNING)
+    user_ids = bench_cycle.user_ids_for(args.users)
+    runner, base_url = await start_stub_server(n_events=args.events, latency=args.latency)
+    print(
+        f"users={len(user_ids)} events={args.events} latency={args.latency}s "
+        f"backend={args.backend} workers/process={args.workers} batch={args.batch}"
+    )
+    baseline = None
+    try:
+        for processes in args.processes:
+            result = await run_workers(args, base_url, user_ids, processes)
+            rate = len(user_ids) / result["wall"]
+            baseline = baseline or rate
+            duplicates = result["results"] - result["distinct"]
+            missing = len(user_ids) - result["distinct"]
+            print(
+                f"processes={processes:2d} wall={result['wall']:6.2f}s {rate:7.1f} users/s "
+                f"x{rate / baseline:4.2f}  per_worker={result['per_worker']} "
+                f"duplicates={duplicates} missing={missing}"
+                + (f" exit_failures={result['failed']}" if result["failed"] else "")
+            )
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="取得ワーカーのスケールアウト・ベンチマーク")
+    parser.add_argument("--users", type=int, default=200, help="監視ユーザー数")
+    parser.add_argument("--events", type=int, default=30, help="生成ページ1件あたりの予定件数")
+    parser.add_argument("--latency", type=float, default=0.2, help="ページの応答遅延（秒）")
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4], help="比べるワーカー数")
+    parser.add_argument("--workers", type=int, default=1, help="ワーカー1つあたりの同時取得数")
+    parser.add_argument("--batch", type=int, default=10, help="ワーカーが一度に借りる人数")
+    parser.add_argument("--backend", default="http", choices=bot.FETCH_BACKENDS, help="取得方式")
+    parser.add_argument("--parser", default="lxml", choices=sorted(bot.HTML_EXTRACTORS), help="HTML解析方式")
+    # 以下は子プロセス（ワーカー）用
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--base-url", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    parser.add_argument("--worker-id", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_child(args)
+    else:
+        asyncio.run(compare(args))
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,118 @@
+"""
+ベンチマーク・動作確認用のフリカレページ生成
+
+recorded ページ（benchmarks/fixtures/mem{ユーザーID}.html）が無い場合に、
+実際のフリカレと同じ ccexp 構造を持つHTMLを今日の日付基準で生成する。
+"""
+
+import json
+import os
+import random
+import re
+from datetime import date, timedelta
+from typing import Optional
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+EVENT_TEXTS = ["観戦", "会議", "打ち合わせ", "ランチ", "通院", "出張", "勉強会", "飲み会", "休み", "配信"]
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="ja">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<link rel="stylesheet" href="/static/style.css">
+</head>
+<body>
+<div id="header"><h1>{title}</h1></div>
+<div id="calendar">
+{cells}
+</div>
+<script src="/static/calendar.js"></script>
+</body>
+</html>
+"""
+
+# JS描画前のページ（ccexp が生HTMLに存在しない）を再現するテンプレート
+# render_delay_ms 後に予定を描画するため、Chromeの待機処理の検証にも使う
+JS_ONLY_TEMPLATE = """<!DOCTYPE html>
+<html lang="ja">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<link rel="stylesheet" href="/static/style.css">
+<link rel="preload" href="/static/font.woff2" as="font" crossorigin>
+</head>
+<body>
+<div id="calendar"></div>
+<script>
+setTimeout(function () {{
+  document.getElementById("calendar").innerHTML = {cells_json};
+}}, {render_delay_ms});
+</script>
+<script src="/static/calendar.js"></script>
+</body>
+</html>
+"""
+
+
+def render_calendar_cells(user_id: str, n_events: int = 20, seed: Optional[int] = None,
+                          start: Optional[date] = None, days: int = 60, revision: int = 0) -> str:
+    """ccexp コンテナ n_events 件分のHTML断片を生成する
+
+    同じ引数なら同じHTMLを返す。revision を変えると予定の一部が変化する。
+    """
+    rng = random.Random(f"{user_id}-{seed}")
+    start = start or date.today()
+    cells = []
+    for i in range(n_events):
+        event_date = start + timedelta(days=rng.randrange(-3, days))
+        if rng.random() < 0.2:
+            body = rng.choice(EVENT_TEXTS)
+        else:
+            body = f"{rng.randrange(8, 23)}:{rng.choice(['00', '15', '30', '45'])} {rng.choice(EVENT_TEXTS)}"
+        if revision and i % 7 == revision % 7:
+            body = f"{body} (更新{revision})"
+        cells.append(
+            f'<div class="ccexp ccexp_list doteki_usersel" '
+            f'id="ccexp-{user_id}-{event_date.year}-{event_date.month}-{event_date.day}">'
+            f'\n    {body}&nbsp;\n</div>'
+        )
+        # 予定以外の装飾要素（実ページと同程度のノイズ）
+        cells.append(f'<div class="cc_day"><span>{event_date.day}</span><img src="/img/{i}.png"></div>')
+    return "\n".join(cells)
+
+
+def render_calendar_page(user_id: str, n_events: int = 20, **kwargs) -> str:
+    """ccexp コンテナを n_events 件含むカレンダーページを生成する"""
+    cells = render_calendar_cells(user_id, n_events, **kwargs)
+    return PAGE_TEMPLATE.format(title=f"フリカレ mem{user_id}", cells=cells)
+
+
+def render_js_only_page(user_id: str, n_events: int = 20, render_delay_ms: int = 300, **kwargs) -> str:
+    """予定をJSで遅れて描画するページを生成する（生HTMLには ccexp が無い）"""
+    cells = render_calendar_cells(user_id, n_events, **kwargs)
+    return JS_ONLY_TEMPLATE.format(
+        title=f"フリカレ mem{user_id}",
+        cells_json=json.dumps(cells, ensure_ascii=False),
+        render_delay_ms=render_delay_ms,
+    )
+
+
+CCEXP_OPEN_TAG = re.compile(r'(<div\b[^>]*\bid="ccexp-[^"]*"[^>]*>)')
+
+
+def mark_revision(html: str, revision: int) -> str:
+    """記録済みページの最初の予定に revision を書き込み、内容を変化させる"""
+    if not revision:
+        return html
+    return CCEXP_OPEN_TAG.sub(rf"\1(更新{revision}) ", html, count=1)
+
+
+def load_recorded_page(user_id: str) -> Optional[str]:
+    """benchmarks/fixtures に記録済みのページがあれば返す"""
+    path = os.path.join(FIXTURES_DIR, f"mem{user_id}.html")
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+    return None
\ No newline at end of file
@@ -0,0 +1,108 @@
+"""
+フリカレのスタブサーバー
+
+/open/mem{ユーザーID}/ に対して、記録済みページ（benchmarks/fixtures/mem{ID}.html）
+または生成したページを返す。app["revisions"] で指定した版に応じて内容が変化する。config.FREECALEND_BASE_URL をこのサーバーに向けると、
+実サイトにアクセスせずにスクレイパーを動作確認できる。
+
+使い方:
+    python benchmarks/stub_server.py --port 8765 --events 30
+    # config.py: FREECALEND_BASE_URL = "http://127.0.0.1:8765"
+
+ユーザーIDが 9 で始まる場合は ccexp をJSで遅れて描画するページを返すため、
+FETCH_BACKEND = "http" のSeleniumフォールバックやChromeの待機処理を確認できる。
+画像・フォント・CSS・JS も asset_latency 秒遅れて返す（リソースブロックの効果測定用）。
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from fixtures import load_recorded_page, mark_revision, render_calendar_page, render_js_only_page  # noqa: E402
+
+
+# 1x1 の透過PNG
+PIXEL_PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d49484452000000010000000108060000001f15c489"
+    "0000000b49444154789c6360000200000500017a5eab3f0000000049454e44ae426082"
+)
+
+STATIC_ASSETS = {
+    "style.css": ("text/css", b"body { font-family: sans-serif; } .ccexp { display: none; }"),
+    "calendar.js": ("application/javascript", b"/* calendar widget */"),
+    "font.woff2": ("font/woff2", b"\0" * 32 * 1024),
+}
+
+
+def create_app(n_events: int = 20, latency: float = 0.0, asset_latency: float = 0.0) -> web.Application:
+    """スタブサーバーのアプリケーションを作成する
+
+    app["revisions"][user_id] を増やすと、そのユーザーのページ内容が変化する。
+    """
+    app = web.Application()
+    app["revisions"] = {}
+    app["requests"] = 0
+
+    async def calendar_page(request: web.Request) -> web.Response:
+        user_id = request.match_info["user_id"]
+        app["requests"] += 1
+        if latency:
+            await asyncio.sleep(latency)
+        revision = app["revisions"].get(user_id, 0)
+        html = load_recorded_page(user_id)
+        if html is not None:
+            html = mark_revision(html, revision)
+        elif user_id.startswith("9"):
+            html = render_js_only_page(user_id, n_events=n_events)
+        else:
+            html = render_calendar_page(user_id, n_events=n_events, revision=revision)
+        return web.Response(text=html, content_type="text/html")
+
+    async def image(request: web.Request) -> web.Response:
+        if asset_latency:
+            await asyncio.sleep(asset_latency)
+        return web.Response(body=PIXEL_PNG, content_type="image/png")
+
+    async def static_asset(request: web.Request) -> web.Response:
+        asset = STATIC_ASSETS.get(request.match_info["name"])
+        if asset is None:
+            raise web.HTTPNotFound()
+        if asset_latency:
+            await asyncio.sleep(asset_latency)
+        content_type, body = asset
+        return web.Response(body=body, content_type=content_type)
+
+    app.router.add_get(r"/open/mem{user_id:\d+}/", calendar_page)
+    app.router.add_get("/img/{name}", image)
+    app.router.add_get("/static/{name}", static_asset)
+    return app
+
+
+async def start_stub_server(host: str = "127.0.0.1", port: int = 0, **kwargs):
+    """スタブサーバーをバックグラウンドで起動し (runner, base_url) を返す"""
+    app = create_app(**kwargs)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{bound_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="フリカレのスタブサーバー")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--events", type=int, default=20, help="生成ページの予定件数")
+    parser.add_argument("--latency", type=float, default=0.0, help="ページの応答遅延（秒）")
+    parser.add_argument("--asset-latency", type=float, default=0.0, help="画像・CSS等の応答遅延（秒）")
+    args = parser.parse_args()
+    web.run_app(create_app(args.events, args.latency, args.asset_latency), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -12,16 +12,37 @@ Date: 2025-06-23
 """
 
 import discord
+from discord import app_commands
 from discord.ext import commands, tasks
+import argparse
 import asyncio
+import atexit
+import bisect
+import functools
+import gzip
 import json
 import logging
+import logging.handlers
+import queue
 import hashlib
+import socket
 import os
+import math
+import sqlite3
+import threading
 import time
-from datetime import datetime, timedelta
-from typing import Optional, Dict, List, Tuple
+import unicodedata
+from datetime import date, datetime, timedelta
+from typing import Optional, Dict, List, NamedTuple, Tuple
 import re
+import contextlib
+import heapq
+import random
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+from aiohttp import web
 
 # Selenium関連
 from selenium import webdriver
@@ -30,51 +51,858 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
+from selenium.common.exceptions import SessionNotCreatedException, WebDriverException
 from webdriver_manager.chrome import ChromeDriverManager
 from bs4 import BeautifulSoup
+from lxml import etree
+from lxml import html as lxml_html
+
+try:
+    import psutil  # Chromeのメモリ計測用（任意）
+except ImportError:
+    psutil = None
 
 # 設定ファイルをインポート
 import config
 
 # --- ログ設定 ---
+# ログの書き込みでイベントループが止まらないよう、出力はキュー経由で別スレッドが行う
+_log_queue = queue.SimpleQueue()
+_log_listener = logging.handlers.QueueListener(
+    _log_queue,
+    logging.FileHandler('bot.log', encoding='utf-8'),
+    logging.StreamHandler()
+)
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('bot.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
+    handlers=[logging.handlers.QueueHandler(_log_queue)]
 )
+_log_listener.start()
+atexit.register(_log_listener.stop)
 logger = logging.getLogger(__name__)
+# 起動時間の計測の基準（ログイン・事前準備・最初のコマンド応答までの時間）
+BOOT_STARTED = time.monotonic()
 
 # --- グローバル設定 ---
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 USERS_FILE = os.path.join(BASE_DIR, "users.json")
 PREVIOUS_DATA_FILE = os.path.join(BASE_DIR, "previous_data.json")
+DATABASE_FILE = os.path.join(BASE_DIR, "freecal.db")
+DRIVER_PATH_FILE = os.path.join(BASE_DIR, "chromedriver_path.txt")
+HISTORY_LIMIT = 20
+STATUS_UPCOMING_COUNT = 5
+USER_LIST_PAGE_SIZE = 25
+AMBIGUOUS_LIST_COUNT = 10
+WEEK_DAYS = 7
+WEEKDAY_LABELS = "月火水木金土日"
 SCREENSHOTS_DIR = os.path.join(BASE_DIR, "screenshots")
 
+DEFAULT_BASE_URL = "https://freecalend.com"
+FETCH_BACKENDS = ("selenium", "http")
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36'
+
+# 生HTMLに ccexp コンテナが含まれているかの簡易判定（JS描画前のページ検出用）
+CCEXP_MARKER_PATTERN = re.compile(r'id\s*=\s*["\']?ccexp-')
+CCEXP_SELECTOR = 'div[id^="ccexp-"]'
+
+# ccexp 要素の件数が安定したかを確認する間隔（秒）
+SETTLE_POLL_SECONDS = 0.25
+# イベントループ遅延の計測間隔（秒）
+LOOP_LAG_INTERVAL_SECONDS = 0.5
+
+# Chromeで読み込まない外部リソース（画像・メディア・フォント・トラッカー）
+BLOCKED_URL_PATTERNS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico", "*.bmp",
+    "*.mp4", "*.webm", "*.mp3", "*.m4a", "*.ogg",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+    "*googlesyndication.com*", "*adservice.google.*", "*facebook.net*",
+    "*amazon-adsystem.com*", "*i-mobile.co.jp*", "*nend.net*",
+]
+
+EVENT_TIME_PATTERN = re.compile(r'(\d{1,2}):(\d{2})\s*(.+)')
+ALL_DAY_LABEL = "終日"
+
+
+class ScheduleEvent(NamedTuple):
+    """予定1件の解析結果（表示用の文字列への変換は format() で描画時に行う）"""
+    sort_key: Tuple[int, int]  # (日付の通し番号, 0時からの分数。終日は -1)
+    date: date
+    time: str                  # "21:00" 形式。終日の予定は空文字
+    all_day: bool
+    text: str
+    div_id: str
+
+    @classmethod
+    def create(cls, event_date: date, text_content: str, div_id: str) -> Optional["ScheduleEvent"]:
+        """ccexp 要素のテキストから時刻と内容を分離して作成する（内容が空なら None）"""
+        time_match = EVENT_TIME_PATTERN.match(text_content)
+        if time_match:
+            hour, minute, text = time_match.groups()
+            time_str = f"{hour}:{minute}"
+            minutes = int(hour) * 60 + int(minute)
+        else:
+            time_str, text, minutes = "", text_content, -1
+        if not text:
+            return None
+        return cls((event_date.toordinal(), minutes), event_date, time_str, not time_str, text, div_id)
+
+    @classmethod
+    def from_record(cls, record: List[str]) -> "ScheduleEvent":
+        """保存形式 [日付, 時刻, 内容, div_id] から復元する"""
+        date_str, time_str, text, div_id = record
+        event_date = date.fromisoformat(date_str)
+        minutes = -1
+        if time_str:
+            hour, minute = time_str.split(':')
+            minutes = int(hour) * 60 + int(minute)
+        return cls((event_date.toordinal(), minutes), event_date, time_str, not time_str, text, div_id)
+
+    def to_record(self) -> List[str]:
+        return [self.date.isoformat(), self.time, self.text, self.div_id]
+
+    @property
+    def slot(self) -> Tuple[date, str]:
+        """同じ予定の変更とみなす単位（日付と時刻）"""
+        return self.date, self.time
+
+    @property
+    def fingerprint(self) -> str:
+        return hashlib.md5(f"{self.date.isoformat()}|{self.time}|{self.text}".encode('utf-8')).hexdigest()[:16]
+
+    def format(self) -> str:
+        time_str = ALL_DAY_LABEL if self.all_day else self.time
+        return f"🔹 {self.date:%m/%d} {time_str} - {self.text}"
+
+
+class FetchResult(NamedTuple):
+    """fetch_events() の結果"""
+    events: List[ScheduleEvent]
+    unchanged: bool  # ページが前回から変わっていないため解析を省略した
+    # このページの指紋（予定を記録した後に commit_fingerprint() で反映する。ccexp が無かった場合は None）
+    fingerprint: Optional["PageFingerprint"] = None
+
+
+class PageFingerprint(NamedTuple):
+    """前回解析したページの識別情報（ccexp 部分のハッシュとHTTPのキャッシュ検証子）
+
+    記録済みの予定と同じページから作った指紋だけを保存する。ページが前回と同じ場合は記録済みの予定を
+    そのまま使うため、対応しない指紋が残ると予定が更新されなくなる。
+    """
+    digest: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+# 304 Not Modified を表す印
+NOT_MODIFIED = object()
+
+CCEXP_OPEN_TAG_PATTERN = re.compile(r'<div\b[^>]*\bid\s*=\s*["\']?ccexp-', re.IGNORECASE)
+DIV_TAG_PATTERN = re.compile(r'<(/?)div\b', re.IGNORECASE)
+
+
+def page_digest(html: str) -> Optional[str]:
+    """最初の ccexp 要素から最後の ccexp 要素の閉じタグまでの範囲のハッシュ（ccexp が無ければ None）
+
+    正規表現で範囲を切り出すだけなので、HTMLの解析よりはるかに軽い。
+    """
+    first = CCEXP_OPEN_TAG_PATTERN.search(html)
+    if not first:
+        return None
+    last = first
+    for last in CCEXP_OPEN_TAG_PATTERN.finditer(html, first.end()):
+        pass
+    end = len(html)
+    depth = 0
+    for tag in DIV_TAG_PATTERN.finditer(html, last.start()):
+        depth += -1 if tag.group(1) else 1
+        if depth == 0:
+            end = tag.end()
+            break
+    return hashlib.md5(html[first.start():end].encode('utf-8')).hexdigest()
+
+
+def format_events(events: List[ScheduleEvent]) -> str:
+    return "\n".join(event.format() for event in events)
+
+
+# Discord の埋め込みの上限（説明文は 4096 文字に余裕を持たせる）
+EMBED_DESCRIPTION_LIMIT = 4000
+EMBEDS_PER_MESSAGE = 10
+MESSAGE_EMBED_CHARS = 6000
+
+
+def split_description(text: str, limit: int = EMBED_DESCRIPTION_LIMIT) -> List[str]:
+    """行単位で limit 文字以内に分割する（1行が limit を超える場合のみ行の途中で切る）"""
+    chunks: List[str] = []
+    current = ""
+    for line in text.split("\n"):
+        while len(line) > limit:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:limit])
+            line = line[limit:]
+        candidate = f"{current}\n{line}" if current else line
+        if len(candidate) > limit:
+            chunks.append(current)
+            current = line
+        else:
+            current = candidate
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def pack_embeds(embeds: List[discord.Embed]) -> List[List[discord.Embed]]:
+    """埋め込みを1メッセージ最大10件・合計6000文字以内の組に詰める"""
+    batches: List[List[discord.Embed]] = []
+    size = 0
+    for embed in embeds:
+        if not batches or len(batches[-1]) >= EMBEDS_PER_MESSAGE or size + len(embed) > MESSAGE_EMBED_CHARS:
+            batches.append([])
+            size = 0
+        batches[-1].append(embed)
+        size += len(embed)
+    return batches
+
+
+def upcoming_events(events: List[ScheduleEvent]) -> List[ScheduleEvent]:
+    """今日以降の予定のみ（キャッシュ取得後に日付が変わった場合の除外用）"""
+    today = datetime.now().date()
+    return [event for event in events if event.date >= today]
+
+
+# --- HTML解析 ---
+# ccexp 要素と <title> だけを取り出す。どちらも (タイトル, [(div_id, テキスト), ...]) を返す。
+CCEXP_XPATH = etree.XPath('//div[starts-with(@id, "ccexp-")]')
+TITLE_XPATH = etree.XPath('//title')
+# BeautifulSoup の get_text() と同じく、コメント・script・style の中身は含めない
+TEXT_XPATH = etree.XPath('.//text()[not(ancestor::script) and not(ancestor::style)]')
+
+
+def _join_text(strings, separator: str) -> str:
+    return separator.join(stripped for stripped in (s.strip() for s in strings) if stripped)
+
+
+def extract_fragments_lxml(html: str) -> Tuple[Optional[str], List[Tuple[str, str]]]:
+    """lxml の XPath で必要な要素だけを読む（通常はこちらを使用）"""
+    if not html or not html.strip():
+        return None, []
+    try:
+        root = lxml_html.document_fromstring(html)
+    except (etree.ParserError, ValueError) as e:
+        logger.error(f"HTMLの解析に失敗しました: {e}")
+        return None, []
+    titles = TITLE_XPATH(root)
+    page_title = _join_text(TEXT_XPATH(titles[0]), "") if titles else None
+    fragments = [
+        (div.get('id', ''), _join_text(TEXT_XPATH(div), " "))
+        for div in CCEXP_XPATH(root)
+    ]
+    return page_title, fragments
+
+
+def extract_fragments_bs4(html: str) -> Tuple[Optional[str], List[Tuple[str, str]]]:
+    """BeautifulSoup でページ全体を読む（v7.0.0 までの方式。比較検証用）"""
+    soup = BeautifulSoup(html, 'lxml')
+    title = soup.find('title')
+    page_title = title.get_text(strip=True) if title else None
+    fragments = [
+        (div.get('id', ''), div.get_text(separator=" ", strip=True))
+        for div in soup.select(CCEXP_SELECTOR)
+    ]
+    return page_title, fragments
+
+
+HTML_EXTRACTORS = {
+    "lxml": extract_fragments_lxml,
+    "bs4": extract_fragments_bs4,
+}
+
+
+# 処理時間ヒストグラムのバケット上限（秒）
+METRIC_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """累積バケット付きのヒストグラム（Prometheus の histogram と同じ形式）"""
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(METRIC_BUCKETS) + 1)  # 最後は +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(METRIC_BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """パーセンタイルの近似値（該当バケットの上限）"""
+        seen = 0
+        for bound, n in zip(METRIC_BUCKETS + (math.inf,), self.counts):
+            seen += n
+            if seen and seen >= q * self.count:
+                return bound
+        return 0.0
+
+
+class Metrics:
+    """取得から通知までの処理時間・件数の計測
+
+    記録はロック付きの辞書操作だけなので常時有効にしておける。
+    render() で Prometheus のテキスト形式に変換する。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms: Dict[Tuple[str, Tuple], Histogram] = {}
+        self.counters: Dict[Tuple[str, Tuple], float] = {}
+        self.user_events: Dict[str, int] = {}
+        self.user_last_success: Dict[str, float] = {}
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, str]) -> Tuple[str, Tuple]:
+        return name, tuple(sorted(labels.items()))
+
+    def observe(self, name: str, value: float, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    @contextlib.contextmanager
+    def timer(self, name: str, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def record_success(self, user_id: str, event_count: int):
+        self.user_events[user_id] = event_count
+        self.user_last_success[user_id] = time.time()
+
+    def forget_user(self, user_id: str):
+        self.user_events.pop(user_id, None)
+        self.user_last_success.pop(user_id, None)
+
+    def histogram(self, name: str, **labels) -> Optional[Histogram]:
+        return self.histograms.get(self._key(name, labels))
+
+    def counter(self, name: str, **labels) -> float:
+        return self.counters.get(self._key(name, labels), 0)
+
+    def labelled(self, name: str) -> List[Tuple[Dict[str, str], Histogram]]:
+        """指定した名前のヒストグラムをラベルごとに返す"""
+        return [(dict(labels), h) for (n, labels), h in sorted(self.histograms.items()) if n == name]
+
+    @staticmethod
+    def _format_labels(labels) -> str:
+        if not labels:
+            return ""
+        escaped = (
+            '{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+            for k, v in labels
+        )
+        return "{" + ",".join(escaped) + "}"
+
+    def render(self) -> str:
+        """Prometheus のテキスト形式で出力する"""
+        lines = []
+        now = time.time()
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+        typed = set()
+        for (name, labels), histogram in histograms:
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            cumulative = 0
+            for bound, n in zip(METRIC_BUCKETS + (math.inf,), histogram.counts):
+                cumulative += n
+                le = "+Inf" if bound == math.inf else repr(bound)
+                lines.append(f"{name}_bucket{self._format_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{self._format_labels(labels)} {histogram.total}")
+            lines.append(f"{name}_count{self._format_labels(labels)} {histogram.count}")
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{self._format_labels(labels)} {value}")
+        lines.append("# TYPE freecal_user_events gauge")
+        for user_id, count in sorted(self.user_events.items()):
+            lines.append(f'freecal_user_events{{user="{user_id}"}} {count}')
+        lines.append("# TYPE freecal_user_last_success_age_seconds gauge")
+        for user_id, fetched_at in sorted(self.user_last_success.items()):
+            lines.append(f'freecal_user_last_success_age_seconds{{user="{user_id}"}} {now - fetched_at:.1f}')
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def record_startup(phase: str, label: str):
+    """起動からの経過時間をログとメトリクスに記録する"""
+    elapsed = time.monotonic() - BOOT_STARTED
+    metrics.observe("freecal_startup_seconds", elapsed, phase=phase)
+    logger.info(f"⏱️ 起動から{label}まで {elapsed:.1f}秒")
+
+
+_driver_path_lock = threading.Lock()
+_driver_path: Optional[str] = None
+
+
+def resolve_driver_path() -> Optional[str]:
+    """chromedriver のパスを1回だけ解決する（None なら Selenium 標準の探索に任せる）
+
+    config.CHROMEDRIVER_PATH → 前回解決したパス（DRIVER_PATH_FILE）→ webdriver-manager の順に探す。
+    webdriver-manager は呼ぶたびにネットワークへ問い合わせるため、結果はファイルに残して
+    次回以降（オフライン時を含む）はそれを使う。
+    """
+    global _driver_path
+    with _driver_path_lock:
+        if _driver_path:
+            return _driver_path
+        candidates = [getattr(config, 'CHROMEDRIVER_PATH', None)]
+        try:
+            with open(DRIVER_PATH_FILE, encoding='utf-8') as f:
+                candidates.append(f.read().strip())
+        except OSError:
+            pass
+        for path in candidates:
+            if path and os.path.isfile(path) and os.access(path, os.X_OK):
+                _driver_path = path
+                return path
+
+        try:
+            path = ChromeDriverManager().install()
+        except Exception as e:
+            logger.warning(f"chromedriver を取得できませんでした。PATH 上のものを使用します: {e}")
+            return None
+        try:
+            with open(DRIVER_PATH_FILE, 'w', encoding='utf-8') as f:
+                f.write(path)
+        except OSError as e:
+            logger.warning(f"chromedriver のパスを保存できませんでした: {e}")
+        logger.info(f"chromedriver のパスを解決しました: {path}")
+        _driver_path = path
+        return path
+
+
+def forget_driver_path():
+    """保存済みの chromedriver のパスを破棄する（Chrome の更新で使えなくなった場合）"""
+    global _driver_path
+    with _driver_path_lock:
+        _driver_path = None
+        with contextlib.suppress(OSError):
+            os.remove(DRIVER_PATH_FILE)
+
+
+CAPTURE_POLICIES = ("off", "errors", "sampled", "always")
+CAPTURE_FORMATS = ("png", "html")
+CAPTURE_NAME_PATTERN = re.compile(r'[^\w.-]+')
+
+
+class DebugCaptureStore:
+    """デバッグ用のスクリーンショット・ページHTMLの保存と整理
+
+    保存するかどうかは SCREENSHOT_POLICY（off / errors / sampled / always）で決める。
+    正常に取得できたページは、取得済みのHTMLをそのまま保存する（画面の描画をしないので取得を遅らせない）。
+    Chrome の画面（SCREENSHOT_FORMAT = "png"）を保存するのはアクセスに失敗した場合だけで、この描画は
+    取得処理の中で行う。ファイルの書き込み（PNG・gzip圧縮したHTML）は専用スレッドで行う。
+    保存済みファイルの合計サイズと保存期間の上限を超えたら、古いものから削除する。
+    """
+
+    def __init__(self, directory: str, policy: str, sample_rate: float, capture_format: str,
+                 max_bytes: int, max_age_seconds: float):
+        self.directory = directory
+        self.policy = policy
+        self.sample_rate = sample_rate
+        self.capture_format = capture_format
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+        self._files: deque = deque()  # (更新時刻, パス, サイズ) を古い順に
+        self.total_bytes = 0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="freecal-capture")
+        if policy != "off":
+            os.makedirs(directory, exist_ok=True)
+            self._scan()
+            self._prune()
+
+    def _scan(self):
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.startswith("debug_"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.path, stat.st_size))
+        files.sort()
+        self._files.extend(files)
+        self.total_bytes = sum(size for _, _, size in files)
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def wants(self, error: bool = False) -> bool:
+        if self.policy == "always":
+            return True
+        if self.policy == "errors":
+            return error
+        if self.policy == "sampled":
+            return error or random.random() < self.sample_rate
+        return False
+
+    def capture(self, driver: webdriver.Chrome, name: str, error: bool = False):
+        """Chrome の現在の画面（SCREENSHOT_FORMAT = "html" ならページHTML）を保存する
+
+        画面の描画（get_screenshot_as_png）は呼び出したスレッドで行うため、失敗時の保存にだけ使う。
+        """
+        if not self.wants(error):
+            return
+        try:
+            if self.capture_format == "html":
+                self._executor.submit(self._write, name, ".html.gz", driver.page_source)
+            else:
+                self._executor.submit(self._write, name, ".png", driver.get_screenshot_as_png())
+        except Exception as e:
+            logger.error(f"スクリーンショットの取得に失敗: {e}")
+
+    def capture_html(self, html: str, name: str, error: bool = False):
+        """取得済みのHTMLを gzip 圧縮して保存する（HTTP取得・正常に取得できたページ）"""
+        if self.wants(error):
+            self._executor.submit(self._write, name, ".html.gz", html)
+
+    def _write(self, name: str, suffix: str, data):
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        path = os.path.join(self.directory, f"debug_{CAPTURE_NAME_PATTERN.sub('_', name)}_{timestamp}{suffix}")
+        try:
+            if suffix == ".html.gz":
+                with gzip.open(path, 'wt', encoding='utf-8') as f:
+                    f.write(data)
+            else:
+                with open(path, 'wb') as f:
+                    f.write(data)
+            size = os.path.getsize(path)
+        except OSError as e:
+            logger.error(f"デバッグファイルの保存に失敗: {e}")
+            return
+        with self._lock:
+            self._files.append((time.time(), path, size))
+            self.total_bytes += size
+        logger.info(f"デバッグファイルを保存しました: {path}")
+        self._prune()
+
+    def _prune(self):
+        """保存期間を過ぎたファイルと、合計サイズの上限を超えた分の古いファイルを削除する"""
+        cutoff = time.time() - self.max_age_seconds if self.max_age_seconds else None
+        removed = 0
+        with self._lock:
+            while self._files and (
+                (cutoff is not None and self._files[0][0] < cutoff)
+                or (self.max_bytes and self.total_bytes > self.max_bytes)
+            ):
+                _, path, size = self._files.popleft()
+                self.total_bytes -= size
+                removed += 1
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(path)
+        if removed:
+            logger.info(f"古いデバッグファイルを {removed}件 削除しました。")
+
+    def close(self):
+        """書き込み待ちのファイルを保存し終えてから終了する"""
+        self._executor.shutdown(wait=True)
+
+
+def create_capture_store() -> DebugCaptureStore:
+    policy = getattr(config, 'SCREENSHOT_POLICY', 'errors')
+    if policy not in CAPTURE_POLICIES:
+        logger.warning(f"不明なスクリーンショット保存方針 '{policy}' のため errors を使用します。")
+        policy = "errors"
+    capture_format = getattr(config, 'SCREENSHOT_FORMAT', 'png')
+    if capture_format not in CAPTURE_FORMATS:
+        logger.warning(f"不明なスクリーンショット形式 '{capture_format}' のため png を使用します。")
+        capture_format = "png"
+    return DebugCaptureStore(
+        SCREENSHOTS_DIR, policy,
+        sample_rate=getattr(config, 'SCREENSHOT_SAMPLE_RATE', 0.05),
+        capture_format=capture_format,
+        max_bytes=int(getattr(config, 'SCREENSHOT_MAX_MB', 200) * 1024 * 1024),
+        max_age_seconds=getattr(config, 'SCREENSHOT_MAX_AGE_DAYS', 7) * 86400,
+    )
+
+
+SITE_KEY = "site"
+
+
+class CircuitBreaker:
+    """続けて失敗する取得先を一定時間止めるサーキットブレーカー（キーごと）
+
+    threshold 回続けて失敗すると開き（取得を止め）、base_seconds × 2^(超過回数) に揺らぎを加えた
+    時間（最大 max_seconds）が過ぎるまで retry_at() が再開時刻を返す。再開後の取得が成功すれば閉じ、
+    失敗すればさらに長く止める。開いている間に届いた失敗は回数だけ数え、停止時間は延ばさない。
+    """
+
+    def __init__(self, threshold: int, base_seconds: float, max_seconds: float, jitter: float = 0.2):
+        self.threshold = max(1, threshold)
+        self.base_seconds = base_seconds
+        self.max_seconds = max(max_seconds, base_seconds)
+        self.jitter = jitter
+        self.failures: Dict[str, int] = {}
+        self.open_until: Dict[str, float] = {}
+
+    def retry_at(self, key: str, now: Optional[float] = None) -> Optional[float]:
+        """止めている場合は再開時刻（取得してよければ None）"""
+        until = self.open_until.get(key)
+        if until is None or (now if now is not None else time.time()) >= until:
+            return None
+        return until
+
+    def record_success(self, key: str) -> bool:
+        """成功を記録する（止めていた取得先が回復した場合は True）"""
+        self.failures.pop(key, None)
+        return self.open_until.pop(key, None) is not None
+
+    def record_failure(self, key: str) -> Optional[float]:
+        """失敗を記録する（今回の失敗で止めることになった場合は再開時刻）"""
+        count = self.failures.get(key, 0) + 1
+        self.failures[key] = count
+        if count < self.threshold or self.retry_at(key) is not None:
+            return None
+        delay = min(self.max_seconds, self.base_seconds * 2 ** min(count - self.threshold, 20))
+        delay *= 1 + random.uniform(-self.jitter, self.jitter)
+        self.open_until[key] = time.time() + delay
+        return self.open_until[key]
+
+    def forget(self, key: str):
+        self.failures.pop(key, None)
+        self.open_until.pop(key, None)
+
+    def open_keys(self) -> List[Tuple[float, str, int]]:
+        """止めている取得先を (再開時刻, キー, 連続失敗回数) で再開の早い順に返す"""
+        now = time.time()
+        return sorted(
+            (until, key, self.failures.get(key, 0)) for key, until in self.open_until.items() if until > now
+        )
+
+
+def create_breakers() -> Tuple[CircuitBreaker, CircuitBreaker]:
+    """(ユーザーごと, サイト全体) のサーキットブレーカー"""
+    minute = 60
+    base = getattr(config, 'BREAKER_BASE_MINUTES', 5) * minute
+    user_breaker = CircuitBreaker(
+        getattr(config, 'USER_BREAKER_THRESHOLD', 3), base,
+        getattr(config, 'BREAKER_MAX_MINUTES', 360) * minute,
+    )
+    site_breaker = CircuitBreaker(
+        getattr(config, 'SITE_BREAKER_THRESHOLD', 5), base,
+        getattr(config, 'SITE_BREAKER_MAX_MINUTES', 60) * minute,
+    )
+    return user_breaker, site_breaker
+
+
+class DriverSessionLost(Exception):
+    """Chromeのセッションが失われた（クラッシュ・強制終了など）"""
+
+
+def chrome_rss_mb(driver: webdriver.Chrome) -> Optional[float]:
+    """chromedriver 配下の全Chromeプロセスの RSS 合計（MB、計測できなければ None）"""
+    if psutil is None:
+        return None
+    try:
+        proc = psutil.Process(driver.service.process.pid)
+        total = sum(p.memory_info().rss for p in proc.children(recursive=True))
+    except (psutil.Error, AttributeError):
+        return None
+    return total / 1024 / 1024
+
+
+class ManagedDriver:
+    """プール内のChrome 1台と、その起動時刻・読み込みページ数"""
+    __slots__ = ("driver", "number", "started_at", "pages", "rss_mb", "dead")
+
+    def __init__(self, driver: webdriver.Chrome, number: int):
+        self.driver = driver
+        self.number = number
+        self.started_at = time.monotonic()
+        self.pages = 0
+        self.rss_mb: Optional[float] = None  # 最後に計測したメモリ使用量
+        self.dead = False
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.started_at
+
 
 class FreecalendScraper:
-    """フリカレのスケジュール取得専用クラス (v7.0.0 - ID形式修正版)"""
+    """フリカレのスケジュール取得専用クラス (v7.0.0 - ID形式修正版)
+
+    取得方式は config.FETCH_BACKEND で切り替える:
+    - "http": 軽量HTTPクライアントで生HTMLを取得し、ccexp が無ければSeleniumにフォールバック
+    - "selenium": 常にヘッドレスChromeで取得（従来の動作）
+    """
     
-    def __init__(self):
-        self.driver: Optional[webdriver.Chrome] = None
+    def __init__(self, backend: Optional[str] = None):
+        self.backend = backend or getattr(config, 'FETCH_BACKEND', 'http')
+        if self.backend not in FETCH_BACKENDS:
+            logger.warning(f"不明な取得方式 '{self.backend}' のため selenium を使用します。")
+            self.backend = "selenium"
+        self.base_url = getattr(config, 'FREECALEND_BASE_URL', DEFAULT_BASE_URL).rstrip('/')
+        self.pool_size = max(1, getattr(config, 'SCRAPER_POOL_SIZE', 3))
+        self.html_parser = getattr(config, 'HTML_PARSER', 'lxml')
+        if self.html_parser not in HTML_EXTRACTORS:
+            logger.warning(f"不明なHTML解析方式 '{self.html_parser}' のため lxml を使用します。")
+            self.html_parser = "lxml"
+        # HTML解析はイベントループを止めないよう専用スレッドで行う（lxml は解析中GILを解放する）
+        self._parse_executor = ThreadPoolExecutor(
+            max_workers=max(1, getattr(config, 'PARSE_WORKERS', 2)), thread_name_prefix="freecal-parse"
+        )
+        # Chromeのプール（起動済みの全ドライバーと、空いているドライバー）
+        self.drivers: List[ManagedDriver] = []
+        self._idle_drivers: List[ManagedDriver] = []
+        self._driver_slots = asyncio.Semaphore(self.pool_size)
+        self.drivers_started = 0
+        self.drivers_recycled = 0
+        # 一定ページ数またはメモリ使用量を超えたChromeは作り直す
+        self.driver_max_pages = getattr(config, 'DRIVER_MAX_PAGES', 200)
+        self.driver_max_rss_mb = getattr(config, 'DRIVER_MAX_RSS_MB', 1024)
+        self.http_session: Optional[aiohttp.ClientSession] = None
         self.is_initialized = False
-        if not os.path.exists(SCREENSHOTS_DIR):
-            os.makedirs(SCREENSHOTS_DIR)
+        # ページが前回と同じなら解析を省略するための情報
+        self.fingerprints: Dict[str, PageFingerprint] = {}
+        self.dirty_fingerprints: set = set()
+        self.fingerprint_hits = 0
+        self.fingerprint_misses = 0
+        self.captures = create_capture_store()
+        # 失敗し続けるユーザー・サイト全体への取得を一時的に止める
+        self.user_breaker, self.site_breaker = create_breakers()
+        self.slow_fetch_seconds = getattr(config, 'BREAKER_SLOW_SECONDS', 20)
+
+    def page_url(self, user_id: str) -> str:
+        return f"{self.base_url}/open/mem{user_id}/"
 
     async def initialize(self) -> bool:
         if self.is_initialized: 
             return True
-        try:
-            loop = asyncio.get_event_loop()
-            self.driver = await loop.run_in_executor(None, self._create_driver)
+        if self.backend == "http":
+            self.http_session = self._create_http_session()
             self.is_initialized = True
-            logger.info("フリカレスクレイパーを初期化しました (v7.0.0)")
+            logger.info("フリカレスクレイパーを初期化しました (v7.0.0 / http)")
             return True
+        # 1台目を起動して動作確認する（残りは必要になった時点で起動）
+        try:
+            async with self._driver_slot():
+                pass
         except Exception as e:
             logger.error(f"スクレイパー初期化エラー: {e}", exc_info=True)
             return False
+        self.is_initialized = True
+        logger.info("フリカレスクレイパーを初期化しました (v7.0.0 / selenium)")
+        return True
+
+    async def warm_up(self, drivers: int = 1):
+        """最初の取得で起動待ちが発生しないよう、事前に準備しておく
+
+        http では取得先への接続（DNS・TLS）を張っておき、selenium では Chrome を
+        drivers 台（最大 pool_size 台）まで先に起動してプールに入れておく。
+        selenium で drivers が 0 の場合は何もしない（initialize() も Chrome を起動するため、最初の取得まで待つ）。
+        """
+        if self.backend != "http" and drivers <= 0:
+            return
+        if not await self.initialize():
+            return
+        if self.backend == "http":
+            try:
+                async with self.http_session.head(self.base_url + "/") as response:
+                    await response.release()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning(f"取得先への接続の事前準備に失敗しました: {e}")
+            return
+        for _ in range(min(drivers, self.pool_size) - len(self.drivers)):
+            async with self._driver_slots:
+                if len(self.drivers) >= self.pool_size:
+                    break
+                self._idle_drivers.append(await self._start_driver())
+
+    @contextlib.asynccontextmanager
+    async def _driver_slot(self):
+        """プールから空いているChromeを借りる（最大 pool_size 台まで遅延起動）
+
+        返却時に、セッションが失われたChromeや寿命を迎えたChromeは終了させる。
+        空いた枠には次に借りる時点で新しいChromeが起動する。
+        """
+        async with self._driver_slots:
+            managed = self._idle_drivers.pop() if self._idle_drivers else await self._start_driver()
+            try:
+                yield managed
+            finally:
+                reason = await self._retire_reason(managed)
+                if reason:
+                    await self._retire_driver(managed, reason)
+                else:
+                    self._idle_drivers.append(managed)
+
+    async def _start_driver(self) -> ManagedDriver:
+        driver = await asyncio.get_event_loop().run_in_executor(None, self._create_driver)
+        self.drivers_started += 1
+        managed = ManagedDriver(driver, self.drivers_started)
+        self.drivers.append(managed)
+        logger.info(f"ヘッドレスChrome #{managed.number} を起動しました ({len(self.drivers)}/{self.pool_size})")
+        return managed
+
+    async def _retire_reason(self, managed: ManagedDriver) -> Optional[str]:
+        if managed.dead:
+            return "セッション消失"
+        if self.driver_max_pages and managed.pages >= self.driver_max_pages:
+            return f"{managed.pages}ページ読み込み"
+        # プロセスツリーをたどる計測はイベントループを止めないよう別スレッドで行う
+        managed.rss_mb = await asyncio.get_event_loop().run_in_executor(None, chrome_rss_mb, managed.driver)
+        if self.driver_max_rss_mb and managed.rss_mb and managed.rss_mb >= self.driver_max_rss_mb:
+            return f"メモリ使用量 {managed.rss_mb:.0f}MB"
+        return None
+
+    async def _retire_driver(self, managed: ManagedDriver, reason: str):
+        if managed in self.drivers:
+            self.drivers.remove(managed)
+        self.drivers_recycled += 1
+        logger.info(f"ヘッドレスChrome #{managed.number} を作り直します（{reason}）")
+        await asyncio.get_event_loop().run_in_executor(None, self._quit_driver, managed.driver)
+
+    @staticmethod
+    def _quit_driver(driver: webdriver.Chrome):
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.warning(f"Chromeの終了に失敗: {e}")
+
+    def _create_http_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=getattr(config, 'HTTP_POOL_SIZE', 4),
+            ttl_dns_cache=300,
+        )
+        timeout = aiohttp.ClientTimeout(total=getattr(config, 'HTTP_TIMEOUT_SECONDS', 15))
+        headers = {
+            'User-Agent': USER_AGENT,
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+            'Accept-Language': 'ja,en-US;q=0.7,en;q=0.3',
+        }
+        return aiohttp.ClientSession(connector=connector, timeout=timeout, headers=headers)
 
     def _create_driver(self) -> webdriver.Chrome:
         chrome_options = Options()
@@ -83,72 +911,267 @@ class FreecalendScraper:
         chrome_options.add_argument('--disable-dev-shm-usage')
         chrome_options.add_argument('--disable-gpu')
         chrome_options.add_argument('--window-size=1920,1200')
-        chrome_options.add_argument('user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36')
+        chrome_options.add_argument(f'user-agent={USER_AGENT}')
         
         chrome_options.add_argument('--disable-blink-features=AutomationControlled')
         chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
         chrome_options.add_experimental_option('useAutomationExtension', False)
+
+        # DOMが構築された時点で制御を戻す（画像などの読み込み完了を待たない）
+        chrome_options.page_load_strategy = getattr(config, 'PAGE_LOAD_STRATEGY', 'eager')
+        block_resources = getattr(config, 'BLOCK_PAGE_RESOURCES', True)
+        if block_resources:
+            chrome_options.add_argument('--blink-settings=imagesEnabled=false')
+            chrome_options.add_experimental_option("prefs", {
+                "profile.managed_default_content_settings.images": 2,
+            })
         
-        service = Service(ChromeDriverManager().install())
-        driver = webdriver.Chrome(service=service, options=chrome_options)
+        try:
+            driver = webdriver.Chrome(service=Service(resolve_driver_path()), options=chrome_options)
+        except SessionNotCreatedException:
+            # Chrome が更新されて保存済みの chromedriver と版が合わなくなった場合は取り直す
+            logger.warning("chromedriver と Chrome の版が合わないため、chromedriver を取得し直します。")
+            forget_driver_path()
+            driver = webdriver.Chrome(service=Service(resolve_driver_path()), options=chrome_options)
         
         driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {
             'source': "Object.defineProperty(navigator, 'webdriver', {get: () => undefined})"
         })
+        if block_resources:
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URL_PATTERNS})
         return driver
 
-    async def get_schedule(self, user_id: str, username: str, today_only: bool = False) -> Optional[str]:
+    async def fetch_events(self, user_id: str, username: str,
+                           previous_events: Optional[List[ScheduleEvent]] = None) -> Optional[FetchResult]:
+        """今後の全予定を取得する（取得失敗時は None）
+
+        previous_events（前回の解析結果）を渡すと、ページが前回と同じ場合は解析を省略して
+        それを返す。今日の予定だけが必要な場合は、結果を filter_today() で絞り込む。
+        サイト全体またはこのユーザーの取得を止めている間は取得せずに None を返す（retry_at() で確認できる）。
+        """
+        if self.retry_at(user_id) is not None:
+            metrics.inc("freecal_fetch_total", result="skipped")
+            return None
+        started = time.monotonic()
+        result = await self._fetch_events(user_id, username, previous_events)
+        elapsed = time.monotonic() - started
+        if result is None:
+            metrics.inc("freecal_fetch_total", result="failure")
+            self._record_failure(user_id, username)
+        else:
+            outcome = "unchanged" if result.unchanged else ("success" if result.events else "empty")
+            metrics.inc("freecal_fetch_total", result=outcome)
+            metrics.record_success(user_id, len(result.events))
+            if self.user_breaker.record_success(user_id):
+                logger.info(f"{username} の取得が回復しました。")
+            if elapsed >= self.slow_fetch_seconds:
+                # 取得できても極端に遅い場合はサイトの不調として数える
+                self._record_site_failure(f"{username} の取得に {elapsed:.0f}秒")
+            elif self.site_breaker.record_success(SITE_KEY):
+                logger.info("フリカレへの取得が回復しました。")
+        return result
+
+    def retry_at(self, user_id: str) -> Optional[float]:
+        """サイト全体またはこのユーザーの取得を止めている場合は再開時刻（取得してよければ None）"""
+        now = time.time()
+        blocked = [
+            until for until in (self.site_breaker.retry_at(SITE_KEY, now), self.user_breaker.retry_at(user_id, now))
+            if until is not None
+        ]
+        return max(blocked) if blocked else None
+
+    def _record_failure(self, user_id: str, username: str):
+        until = self.user_breaker.record_failure(user_id)
+        if until is not None:
+            logger.warning(
+                f"{username} の取得に {self.user_breaker.failures[user_id]}回続けて失敗したため、"
+                f"{(until - time.time()) / 60:.0f}分間このユーザーの取得を止めます。"
+            )
+        self._record_site_failure(f"{username} の取得に失敗")
+
+    def _record_site_failure(self, reason: str):
+        until = self.site_breaker.record_failure(SITE_KEY)
+        if until is not None:
+            logger.warning(
+                f"取得の失敗・遅延が {self.site_breaker.failures[SITE_KEY]}回続いたため（最後: {reason}）、"
+                f"{(until - time.time()) / 60:.0f}分間フリカレへの取得を止めます。"
+            )
+
+    async def _fetch_events(self, user_id: str, username: str,
+                            previous_events: Optional[List[ScheduleEvent]]) -> Optional[FetchResult]:
         if not await self.initialize(): 
             return None
 
-        url = f"https://freecalend.com/open/mem{user_id}/"
-        logger.info(f"フリカレアクセス開始: {username} ({user_id}) - 今日のみ: {today_only}")
+        url = self.page_url(user_id)
+        known = self.fingerprints.get(user_id) if previous_events is not None else None
+        logger.info(f"フリカレアクセス開始: {username} ({user_id})")
         
         try:
-            html = await asyncio.get_event_loop().run_in_executor(
-                None, self._fetch_page_and_get_html, url, username
-            )
+            html = None
+            etag = last_modified = None
+            if self.backend == "http":
+                with metrics.timer("freecal_stage_seconds", stage="fetch_http"):
+                    html, etag, last_modified = await self._fetch_html_http(url, username, known)
+                if html is NOT_MODIFIED:
+                    self.fingerprint_hits += 1
+                    logger.info(f"{username} のページは前回から変更されていません (304)。")
+                    return FetchResult(upcoming_events(previous_events), True, known)
+                if html is not None and not CCEXP_MARKER_PATTERN.search(html):
+                    logger.warning(f"HTTP取得したHTMLに 'ccexp' が無いため、Seleniumで再取得します: {username}")
+                    self.captures.capture_html(html, f"{username}_http_no_ccexp", error=True)
+                    html = None
+                    etag = last_modified = None
+
+            if html is None:
+                try:
+                    html = await self._fetch_html_selenium(url, username)
+                except Exception as e:
+                    logger.error(f"Chromeの起動に失敗しました: {e}", exc_info=True)
+                    return None
             
             if not html:
                 logger.error(f"ページのHTML取得に失敗しました: {username}")
-                return ""
+                return None
+            # 正常取得の保存（sampled / always）は取得方式によらず取得済みのHTMLを使う
+            self.captures.capture_html(html, username)
 
-            schedule_list = self._parse_final(html, user_id, today_only)
-            
+            with metrics.timer("freecal_stage_seconds", stage="parse"):
+                digest, schedule_list = await asyncio.get_event_loop().run_in_executor(
+                    self._parse_executor, self._analyze_page, html, user_id, known
+                )
+            fingerprint = PageFingerprint(digest, etag, last_modified) if digest else None
+            if schedule_list is None:
+                self.fingerprint_hits += 1
+                self._remember_fingerprint(user_id, fingerprint)
+                logger.info(f"{username} の予定部分は前回から変更されていません。解析を省略します。")
+                return FetchResult(upcoming_events(previous_events), True, fingerprint)
+
+            self.fingerprint_misses += 1
             if not schedule_list:
                 logger.warning(f"{username} のスケジュール解析結果が空です。")
-            
-            sorted_events = self.sort_events(schedule_list)
-            return "\n".join(sorted_events)
+                if digest is None:
+                    self.captures.capture_html(html, f"{username}_no_ccexp", error=True)
+            # 解析した場合の指紋は、呼び出し側が予定を記録してから commit_fingerprint() で反映する
+            # （記録した予定と対応しない指紋で解析を省略しないため）
+            return FetchResult(schedule_list, False, fingerprint)
 
         except Exception as e:
             logger.error(f"スケジュール取得の包括的なエラー ({username}): {e}", exc_info=True)
-            self.save_debug_screenshot(f"{username}_critical_error")
-            return ""
+            return None
+
+    def _remember_fingerprint(self, user_id: str, fingerprint: PageFingerprint):
+        if self.fingerprints.get(user_id) != fingerprint:
+            self.fingerprints[user_id] = fingerprint
+            self.dirty_fingerprints.add(user_id)
+
+    def commit_fingerprint(self, user_id: str, fingerprint: Optional[PageFingerprint]):
+        """記録した予定に対応するページの指紋を反映する（None なら消して、次回は必ず解析する）"""
+        if fingerprint:
+            self._remember_fingerprint(user_id, fingerprint)
+        elif self.fingerprints.pop(user_id, None) is not None:
+            self.dirty_fingerprints.add(user_id)
+
+    def forget_fingerprint(self, user_id: str):
+        self.fingerprints.pop(user_id, None)
+        self.dirty_fingerprints.discard(user_id)
 
-    def _fetch_page_and_get_html(self, url: str, username: str) -> Optional[str]:
+    async def _fetch_html_http(self, url: str, username: str, known: Optional[PageFingerprint] = None):
+        """HTTPクライアントで生HTMLを取得し (HTML, ETag, Last-Modified) を返す
+
+        失敗時の HTML は None。前回の検証子で 304 が返った場合は NOT_MODIFIED。
+        """
+        headers = {}
+        if known and known.etag:
+            headers['If-None-Match'] = known.etag
+        if known and known.last_modified:
+            headers['If-Modified-Since'] = known.last_modified
         try:
-            self.driver.get(url)
-            WebDriverWait(self.driver, 20).until(
-                EC.presence_of_element_located((By.TAG_NAME, "body"))
-            )
-            time.sleep(3)
-            page_html = self.driver.page_source
-            self.save_debug_screenshot(username)
-            return page_html
+            async with self.http_session.get(url, headers=headers) as response:
+                if response.status == 304 and known:
+                    return NOT_MODIFIED, known.etag, known.last_modified
+                if response.status != 200:
+                    logger.error(f"HTTP取得に失敗しました ({username}): ステータス {response.status}")
+                    return None, None, None
+                html = await response.text()
+                return html, response.headers.get('ETag'), response.headers.get('Last-Modified')
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"HTTP取得エラー ({username}): {e}")
+            return None, None, None
+
+    async def _fetch_html_selenium(self, url: str, username: str) -> Optional[str]:
+        """プールのChromeでHTMLを取得する（セッションが失われていたら作り直して1回だけ再試行）"""
+        for attempt in range(2):
+            async with self._driver_slot() as managed:
+                managed.pages += 1
+                try:
+                    with metrics.timer("freecal_stage_seconds", stage="fetch_selenium"):
+                        return await asyncio.get_event_loop().run_in_executor(
+                            None, self._fetch_page_and_get_html, managed.driver, url, username
+                        )
+                except DriverSessionLost as e:
+                    managed.dead = True
+                    logger.warning(f"Chrome #{managed.number} のセッションが失われました ({username}): {e}")
+            if attempt == 0:
+                logger.info(f"新しいChromeで再取得します: {username}")
+        return None
+
+    def _fetch_page_and_get_html(self, driver: webdriver.Chrome, url: str, username: str) -> Optional[str]:
+        try:
+            driver.get(url)
+            self._wait_for_schedule(driver)
+            return driver.page_source
         except Exception as e:
+            if isinstance(e, WebDriverException) and not self._session_alive(driver):
+                raise DriverSessionLost(e.msg or type(e).__name__) from e
             logger.error(f"ページへのアクセス自体に失敗しました: {e}", exc_info=True)
-            self.save_debug_screenshot(f"{username}_access_failed")
+            self.captures.capture(driver, f"{username}_access_failed", error=True)
             return None
 
-    def _parse_final(self, html: str, user_id: str, today_only: bool = False) -> List[str]:
+    @staticmethod
+    def _session_alive(driver: webdriver.Chrome) -> bool:
+        try:
+            driver.execute_script("return 1;")
+            return True
+        except WebDriverException:
+            return False
+
+    def _wait_for_schedule(self, driver: webdriver.Chrome):
+        """ccexp 要素が出揃うまで待つ
+
+        件数が2回連続で同じになった時点で終了する。予定が1件も無いページでは
+        PAGE_SETTLE_MAX_SECONDS（従来の固定待機3秒）を上限に待って終了する。
+        """
+        WebDriverWait(driver, 20).until(
+            EC.presence_of_element_located((By.TAG_NAME, "body"))
+        )
+        deadline = time.monotonic() + getattr(config, 'PAGE_SETTLE_MAX_SECONDS', 3)
+        last_count = -1
+        while time.monotonic() < deadline:
+            count = driver.execute_script(
+                "return document.querySelectorAll(arguments[0]).length;", CCEXP_SELECTOR
+            )
+            if count and count == last_count:
+                return
+            last_count = count
+            time.sleep(SETTLE_POLL_SECONDS)
+
+    def _analyze_page(self, html: str, user_id: str, known: Optional[PageFingerprint]):
+        """ページのハッシュを計算し、前回と異なれば解析・並べ替えまで行う（解析用スレッドで実行）
+
+        戻り値は (ハッシュ, 予定一覧)。前回と同じページなら予定一覧は None。
+        """
+        digest = page_digest(html)
+        if known and digest and digest == known.digest:
+            return digest, None
+        return digest, self.sort_events(self._parse_final(html, user_id))
+
+    def _parse_final(self, html: str, user_id: str, parser: Optional[str] = None) -> List[ScheduleEvent]:
         """フリカレの隠されたデータ構造 `ccexp` を直接読み取る（ID形式修正版）"""
-        soup = BeautifulSoup(html, 'lxml')
-        page_title = soup.find('title').get_text(strip=True) if soup.find('title') else "タイトル不明"
-        logger.info(f"最終解析開始 - ページタイトル: '{page_title}'")
+        page_title, schedule_divs = HTML_EXTRACTORS[parser or self.html_parser](html)
+        logger.info(f"最終解析開始 - ページタイトル: '{page_title or 'タイトル不明'}'")
 
         # ID形式: ccexp-[ユーザーID]-[年]-[月]-[日] または ccexp-[年]-[月]-[日]-[連番]
-        schedule_divs = soup.select('div[id^="ccexp-"]')
         if not schedule_divs:
             logger.error("最終解析エラー: スケジュールデータコンテナ 'ccexp' が見つかりませんでした。")
             return []
@@ -159,9 +1182,8 @@ class FreecalendScraper:
         today = datetime.now().date()
         
         events = []
-        for div in schedule_divs:
+        for div_id, text_content in schedule_divs:
             try:
-                div_id = div.get('id', '')
                 parts = div_id.split('-')
                 
                 # ID形式の判定と日付抽出
@@ -179,159 +1201,1571 @@ class FreecalendScraper:
                 # 過去の予定はスキップ
                 if event_date < today:
                     continue
-                
-                # 今日のみモードで今日以外はスキップ
-                if today_only and event_date != today:
-                    continue
                     
             except (IndexError, ValueError) as e:
                 logger.debug(f"日付解析スキップ: {div_id} - {e}")
                 continue
 
-            text_content = div.get_text(separator=" ", strip=True)
             if not text_content:
                 continue
                 
-            # 時刻と内容を分離
-            time_match = re.match(r'(\d{1,2}:\d{2})\s*(.+)', text_content)
-            if time_match:
-                time_str, event_str = time_match.group(1), time_match.group(2)
-            else:
-                time_str, event_str = "終日", text_content
-
-            if not event_str: 
-                continue
-                
-            events.append(f"🔹 {month:02d}/{day:02d} {time_str} - {event_str}")
+            event = ScheduleEvent.create(event_date, text_content, div_id)
+            if event:
+                events.append(event)
             
         return events
 
-    def sort_events(self, events: List[str]) -> List[str]:
-        def get_sort_key(event_line: str):
-            match = re.search(r'(\d{2})/(\d{2})', event_line)
-            if match: 
-                return f"{match.group(1)}{match.group(2)}"
-            return "9999"
-        return sorted(events, key=get_sort_key)
+    def sort_events(self, events: List[ScheduleEvent]) -> List[ScheduleEvent]:
+        """日付・時刻順（同じ日は終日の予定が先）"""
+        return sorted(events, key=lambda event: event.sort_key)
+
+    @staticmethod
+    def filter_today(events: List[ScheduleEvent]) -> List[ScheduleEvent]:
+        """今日の予定のみに絞り込む（!check 用）"""
+        today = datetime.now().date()
+        return [event for event in events if event.date == today]
+
+    def cleanup(self):
+        for managed in self.drivers:
+            self._quit_driver(managed.driver)
+        self.drivers = []
+        self._idle_drivers = []
+        self.is_initialized = False
+
+    async def close(self):
+        """HTTPセッションとChromeを終了する"""
+        if self.http_session and not self.http_session.closed:
+            await self.http_session.close()
+        self.http_session = None
+        await asyncio.get_event_loop().run_in_executor(None, self.cleanup)
+        await asyncio.get_event_loop().run_in_executor(None, self.captures.close)
+        self._parse_executor.shutdown(wait=False)
+
+
+class TokenBucket:
+    """プロセス内の全ワーカー共通のアクセス頻度制限（トークンバケット）"""
+
+    def __init__(self, rate_per_second: float, capacity: float):
+        self.rate = rate_per_second
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class SharedTokenBucket:
+    """データベースを共有する全プロセス共通のアクセス頻度制限（取得ワーカー用）
+
+    トークンの残量はデータベース（rate_limits テーブル）に置き、取り出しは書き込みトランザクションで行う。
+    取得ワーカーを何プロセス起動しても、合計のアクセス頻度は RATE_LIMIT_PER_MINUTE に収まる。
+    """
+
+    def __init__(self, data_manager: "DataManager", name: str, rate_per_second: float, capacity: float):
+        self.data_manager = data_manager
+        self.name = name
+        self.rate = rate_per_second
+        self.capacity = max(1.0, capacity)
+        # 同じプロセスのワーカーは順番に並ばせ、データベースへの問い合わせを増やさない
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                wait = await self.data_manager.run(self.data_manager.take_token, self.name, self.rate, self.capacity)
+                if wait <= 0:
+                    return
+                await asyncio.sleep(wait)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """最近傍順位法によるパーセンタイル（values が空なら 0）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class CycleStats:
+    """定期チェック1回分の集計"""
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.checked = 0
+        self.failures = 0
+        self.unchanged = 0
+        self.deferred = 0  # 取得を止めているため延期した人数
+        self.fetch_times: List[float] = []
+        self.loop_lag: Tuple[float, float] = (0.0, 0.0)  # イベントループ遅延（最大, 平均）
+        self.notified = 0  # 通知した埋め込みの数
+        self.messages = 0
+        self.send_failures = 0
+
+    def summary(self) -> str:
+        elapsed = time.monotonic() - self.started_at
+        return (
+            f"チェック {self.checked}人 / 失敗 {self.failures}件 / 未変更で解析省略 {self.unchanged}件 / "
+            f"取得停止中で延期 {self.deferred}人 / "
+            f"取得時間 p50 {percentile(self.fetch_times, 50):.2f}秒 "
+            f"p95 {percentile(self.fetch_times, 95):.2f}秒 / "
+            f"通知 埋め込み {self.notified}件 → メッセージ {self.messages}通（送信失敗 {self.send_failures}通） / "
+            f"ループ遅延 最大 {self.loop_lag[0]:.3f}秒 平均 {self.loop_lag[1]:.3f}秒 / 所要 {elapsed:.0f}秒"
+        )
+
+
+class LoopLagMonitor:
+    """イベントループの遅延（sleep から予定より遅れて戻った時間）を一定間隔で計測する"""
+
+    def __init__(self, interval: float, warn_seconds: float):
+        self.interval = interval
+        self.warn_seconds = warn_seconds
+        self.max_lag = 0.0
+        self._total = 0.0
+        self._samples = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - started - self.interval)
+            self.max_lag = max(self.max_lag, lag)
+            self._total += lag
+            self._samples += 1
+            if lag >= self.warn_seconds:
+                logger.warning(f"イベントループが {lag:.2f}秒 停止していました。")
+
+    def take(self) -> Tuple[float, float]:
+        """前回の呼び出し以降の (最大, 平均) 遅延を返し、集計をリセットする"""
+        result = (self.max_lag, self._total / self._samples if self._samples else 0.0)
+        self.max_lag = self._total = 0.0
+        self._samples = 0
+        return result
+
+
+DATE_ARG_PATTERN = re.compile(r'(?:(\d{4})[-/年])?(\d{1,2})[-/月](\d{1,2})日?')
+RELATIVE_DAYS = {"今日": 0, "きょう": 0, "明日": 1, "あした": 1, "明後日": 2, "あさって": 2, "today": 0, "tomorrow": 1}
+
+
+def parse_date_arg(text: str, today: Optional[date] = None) -> Optional[date]:
+    """コマンドの日付指定（7/15・2025-07-15・7月15日・明日 など）を解釈する（読めなければ None）
+
+    年を省略した日付が今日より前なら来年の日付とみなす。
+    """
+    today = today or datetime.now().date()
+    text = unicodedata.normalize('NFKC', text).strip().casefold()
+    if text in RELATIVE_DAYS:
+        return today + timedelta(days=RELATIVE_DAYS[text])
+    match = DATE_ARG_PATTERN.fullmatch(text)
+    if not match:
+        return None
+    year, month, day = match.groups()
+    try:
+        parsed = date(int(year) if year else today.year, int(month), int(day))
+        if not year and parsed < today:
+            parsed = parsed.replace(year=today.year + 1)
+    except ValueError:
+        return None
+    return parsed
+
+
+class EventIndex:
+    """記録済みの予定の日付別インデックス（取得し直さずに期間・日付・空き状況に答える）
+
+    各ユーザーの最新の記録から作り、取得で予定が変わったユーザーの分だけ差し替える。
+    """
+
+    def __init__(self, snapshots: Dict[str, List[ScheduleEvent]]):
+        self.by_user: Dict[str, List[ScheduleEvent]] = {}
+        self.by_date: Dict[date, Dict[str, List[ScheduleEvent]]] = {}
+        for user_id, events in snapshots.items():
+            self.replace(user_id, events)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self.by_user
+
+    def replace(self, user_id: str, events: List[ScheduleEvent]):
+        # データベースの記録と同じく、同じ予定（fingerprint が同じもの）は1件にまとめる
+        events = sorted({event.fingerprint: event for event in events}.values(), key=lambda event: event.sort_key)
+        if self.by_user.get(user_id) == events:
+            return
+        self.remove(user_id)
+        self.by_user[user_id] = events
+        for event in events:
+            self.by_date.setdefault(event.date, {}).setdefault(user_id, []).append(event)
+
+    def remove(self, user_id: str):
+        for event_date in {event.date for event in self.by_user.pop(user_id, [])}:
+            users = self.by_date[event_date]
+            users.pop(user_id, None)
+            if not users:
+                del self.by_date[event_date]
+
+    def on(self, day: date) -> Dict[str, List[ScheduleEvent]]:
+        """指定日に予定のあるユーザーとその予定"""
+        return self.by_date.get(day, {})
+
+    def between(self, user_id: str, start: date, end: date) -> List[ScheduleEvent]:
+        """指定ユーザーの start〜end（両端を含む）の予定"""
+        events = self.by_user.get(user_id, [])
+        low = bisect.bisect_left(events, (start.toordinal(), -1), key=lambda event: event.sort_key)
+        high = bisect.bisect_left(events, (end.toordinal() + 1, -1), key=lambda event: event.sort_key)
+        return events[low:high]
+
+    def free_on(self, day: date, user_ids) -> List[str]:
+        """記録のあるユーザーのうち、指定日に予定の無いユーザー"""
+        busy = self.on(day)
+        return [user_id for user_id in user_ids if user_id in self.by_user and user_id not in busy]
+
+
+class CacheEntry:
+    """ユーザー1人分の解析済み予定"""
+    __slots__ = ("events", "unchanged", "fingerprint", "fetched_at")
+
+    def __init__(self, events: List[ScheduleEvent], unchanged: bool = False,
+                 fingerprint: Optional[PageFingerprint] = None):
+        self.events = events
+        self.unchanged = unchanged  # 取得したページが前回と同じだった
+        self.fingerprint = fingerprint  # 予定を解析したページの指紋
+        self.fetched_at = time.monotonic()
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.fetched_at
+
+
+class ScheduleCache:
+    """解析済み予定のユーザー別TTLキャッシュ
+
+    同じユーザーへの同時リクエストは、実行中の1回の取得を共有する（single-flight）。
+    定期チェックとコマンドの両方が refresh() で最新の結果を書き込む。
+    """
+
+    def __init__(self, scraper: FreecalendScraper, ttl_seconds: float, stale_seconds: float,
+                 snapshot_loader=None):
+        self.scraper = scraper
+        # キャッシュが無い場合に前回の予定を読み込むコルーチン関数（ページ未変更時の解析省略用）
+        self.snapshot_loader = snapshot_loader
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = max(stale_seconds, ttl_seconds)
+        self._entries: Dict[str, CacheEntry] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    def peek(self, user_id: str) -> Optional[CacheEntry]:
+        """期限切れ（stale期間も超過）でなければキャッシュを返す"""
+        entry = self._entries.get(user_id)
+        if entry and entry.age <= self.stale_seconds:
+            return entry
+        return None
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        return entry.age <= self.ttl_seconds
+
+    def invalidate(self, user_id: str):
+        self._entries.pop(user_id, None)
+
+    async def refresh(self, user_id: str, username: str) -> Optional[CacheEntry]:
+        """フリカレから取得し直す（実行中の取得があればその結果を待つ）"""
+        task = self._inflight.get(user_id)
+        if task is None:
+            task = asyncio.create_task(self._fetch(user_id, username))
+            self._inflight[user_id] = task
+            task.add_done_callback(lambda _: self._inflight.pop(user_id, None))
+        # 待っている側がキャンセルされても、共有している取得は止めない
+        return await asyncio.shield(task)
+
+    async def _fetch(self, user_id: str, username: str) -> Optional[CacheEntry]:
+        entry = self._entries.get(user_id)
+        # 解析を省略できるのは、前回の予定が記録済みの指紋と同じページのものである場合だけ
+        # （キャッシュの予定がまだ記録されていなければ、記録済みの予定を読み直す）
+        previous = None
+        if entry and entry.fingerprint == self.scraper.fingerprints.get(user_id):
+            previous = entry.events
+        if previous is None and self.snapshot_loader:
+            previous = await self.snapshot_loader(user_id)
+        result = await self.scraper.fetch_events(user_id, username, previous)
+        if result is None:
+            return None
+        entry = CacheEntry(result.events, result.unchanged, result.fingerprint)
+        self._entries[user_id] = entry
+        return entry
+
+
+class AdaptiveScheduler:
+    """ユーザーごとの次回チェック時刻を管理する優先度キュー
+
+    チェック間隔は、変更が見つかれば短く、見つからなければ長くなる（min〜max の範囲）。
+    管理者が固定（ピン留め）した間隔は調整しない。どちらも揺らぎ（jitter）を加えて分散させる。
+    """
+
+    SHRINK_FACTOR = 0.5
+    GROWTH_FACTOR = 1.5
+
+    def __init__(self, base_interval: float, min_interval: float, max_interval: float, jitter: float):
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.base_interval = self._clamp(base_interval)
+        self.jitter = jitter
+        self.intervals: Dict[str, float] = {}
+        self.pinned: Dict[str, float] = {}
+        self._heap: List[Tuple[float, str]] = []
+        self._due: Dict[str, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def _clamp(self, interval: float) -> float:
+        return min(self.max_interval, max(self.min_interval, interval))
+
+    def _push(self, user_id: str, due: float):
+        # 古い要素はヒープに残したまま、_due と一致しないものを取り出し時に読み飛ばす
+        self._due[user_id] = due
+        heapq.heappush(self._heap, (due, user_id))
+
+    def add(self, user_id: str, interval: Optional[float] = None, pinned: Optional[float] = None,
+            next_due: Optional[float] = None):
+        self.intervals[user_id] = self._clamp(interval or self.base_interval)
+        if pinned:
+            self.pinned[user_id] = pinned
+        self._push(user_id, next_due if next_due is not None else time.time())
+
+    def remove(self, user_id: str):
+        self.intervals.pop(user_id, None)
+        self.pinned.pop(user_id, None)
+        self._due.pop(user_id, None)
+
+    def next_due(self, user_id: str) -> Optional[float]:
+        """次回チェック時刻（チェック実行中は None）"""
+        return self._due.get(user_id)
+
+    def interval_of(self, user_id: str) -> float:
+        return self.pinned.get(user_id) or self.intervals.get(user_id, self.base_interval)
+
+    def pop_due(self, now: Optional[float] = None) -> List[str]:
+        """チェック時刻を過ぎたユーザーを早い順に取り出す"""
+        now = now if now is not None else time.time()
+        due_users = []
+        while self._heap and self._heap[0][0] <= now:
+            due, user_id = heapq.heappop(self._heap)
+            if self._due.get(user_id) != due:
+                continue
+            del self._due[user_id]
+            due_users.append(user_id)
+        return due_users
+
+    def upcoming(self, count: int) -> List[Tuple[float, str]]:
+        return heapq.nsmallest(count, ((due, user_id) for user_id, due in self._due.items()))
+
+    def reschedule(self, user_id: str, changed: Optional[bool], now: Optional[float] = None) -> Optional[float]:
+        """チェック結果に応じて間隔を調整し、次回のチェック時刻を返す（changed=None は取得失敗）"""
+        if user_id not in self.intervals:
+            return None
+        if changed is True:
+            self.intervals[user_id] = self._clamp(self.intervals[user_id] * self.SHRINK_FACTOR)
+        elif changed is False:
+            self.intervals[user_id] = self._clamp(self.intervals[user_id] * self.GROWTH_FACTOR)
+        delay = self.interval_of(user_id) * (1 + random.uniform(-self.jitter, self.jitter))
+        due = (now if now is not None else time.time()) + delay
+        self._push(user_id, due)
+        return due
+
+    def defer(self, user_id: str, due: float):
+        """間隔は変えずに次回のチェック時刻だけを指定する（取得を止めている間の延期用）"""
+        if user_id in self.intervals:
+            self._push(user_id, due)
+
+    def pin(self, user_id: str, interval: Optional[float]):
+        """間隔を固定する（None で解除）。固定後の時刻の方が早ければ次回予定を前倒しする"""
+        if interval:
+            self.pinned[user_id] = interval
+        else:
+            self.pinned.pop(user_id, None)
+        due = self._due.get(user_id)
+        earliest = time.time() + self.interval_of(user_id)
+        if due is not None and earliest < due:
+            self._push(user_id, earliest)
+
+
+def create_scheduler() -> AdaptiveScheduler:
+    hour = 3600
+    return AdaptiveScheduler(
+        base_interval=config.CHECK_INTERVAL_HOURS * hour,
+        min_interval=getattr(config, 'CHECK_INTERVAL_MIN_HOURS', 1) * hour,
+        max_interval=getattr(config, 'CHECK_INTERVAL_MAX_HOURS', 24) * hour,
+        jitter=getattr(config, 'CHECK_INTERVAL_JITTER', 0.1),
+    )
+
+
+class NotificationOutbox:
+    """定期チェック1回分の通知をためて、まとめて送信する
+
+    チャンネルごとに埋め込みを pack_embeds() で詰めて送るため、変更が100人分あっても
+    API呼び出しは十数回で済む。送信間隔はトークンバケットで空け、レート制限（429）や
+    サーバーエラー（5xx）の場合は待ってから再送する。
+    """
+
+    def __init__(self, rate_limiter: TokenBucket, max_retries: int):
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self._pending: Dict[int, Tuple[object, List[discord.Embed]]] = {}
+
+    def __len__(self) -> int:
+        return sum(len(embeds) for _, embeds in self._pending.values())
+
+    def add(self, channel, embeds: List[discord.Embed]):
+        self._pending.setdefault(channel.id, (channel, []))[1].extend(embeds)
+
+    async def flush(self) -> Tuple[int, int]:
+        """ためた通知を送信し、(送信できたメッセージ数, 失敗したメッセージ数) を返す"""
+        pending, self._pending = self._pending, {}
+        sent = failed = 0
+        for channel, embeds in pending.values():
+            for batch in pack_embeds(embeds):
+                if await self.send(channel, batch):
+                    sent += 1
+                else:
+                    failed += 1
+        return sent, failed
+
+    async def send(self, channel, embeds: List[discord.Embed]) -> bool:
+        for attempt in range(self.max_retries + 1):
+            await self.rate_limiter.acquire()
+            try:
+                with metrics.timer("freecal_stage_seconds", stage="notify"):
+                    await channel.send(embeds=embeds)
+                return True
+            except discord.HTTPException as e:
+                retryable = e.status == 429 or e.status >= 500
+                if not retryable or attempt == self.max_retries:
+                    logger.error(f"通知の送信に失敗しました（埋め込み {len(embeds)}件）: {e}")
+                    return False
+                delay = 2 ** attempt
+                logger.warning(f"通知の送信を {delay}秒後に再試行します ({attempt + 1}/{self.max_retries}): {e}")
+                await asyncio.sleep(delay)
+        return False
+
+
+def create_outbox() -> NotificationOutbox:
+    """config から通知の送信キューを作る"""
+    per_minute = getattr(config, 'NOTIFY_RATE_PER_MINUTE', 30)
+    burst = getattr(config, 'NOTIFY_RATE_BURST', 5)
+    return NotificationOutbox(TokenBucket(per_minute / 60, burst), getattr(config, 'NOTIFY_MAX_RETRIES', 3))
+
+
+def create_rate_limiter(data_manager: Optional["DataManager"] = None):
+    """config からフリカレへのアクセス頻度制限を作る（data_manager を渡すとプロセス間で共有する）"""
+    per_minute = getattr(config, 'RATE_LIMIT_PER_MINUTE', None)
+    if not per_minute:
+        # 旧設定（ACCESS_INTERVAL_SECONDS）からの換算
+        per_minute = 60 / max(1, getattr(config, 'ACCESS_INTERVAL_SECONDS', 30))
+    # 連続アクセスは既定で許可しない（robots.txt のアクセス間隔30秒以上を守る）
+    burst = getattr(config, 'RATE_LIMIT_BURST', 1)
+    if data_manager is not None:
+        return SharedTokenBucket(data_manager, "freecalend", per_minute / 60, burst)
+    return TokenBucket(per_minute / 60, burst)
+
+
+class ScheduleChanges(NamedTuple):
+    """前回チェックからの予定の差分"""
+    added: List[ScheduleEvent]
+    removed: List[ScheduleEvent]
+    modified: List[Tuple[ScheduleEvent, ScheduleEvent]]  # (変更前, 変更後)
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.modified)
+
+    @property
+    def summary(self) -> str:
+        return f"追加 {len(self.added)} / 削除 {len(self.removed)} / 変更 {len(self.modified)}"
+
+    def to_records(self) -> Dict[str, list]:
+        """保存形式（JSON に変換できる形）にする"""
+        return {
+            "added": [event.to_record() for event in self.added],
+            "removed": [event.to_record() for event in self.removed],
+            "modified": [[old.to_record(), new.to_record()] for old, new in self.modified],
+        }
+
+    @classmethod
+    def from_records(cls, records: Dict[str, list]) -> "ScheduleChanges":
+        return cls(
+            [ScheduleEvent.from_record(record) for record in records["added"]],
+            [ScheduleEvent.from_record(record) for record in records["removed"]],
+            [(ScheduleEvent.from_record(old), ScheduleEvent.from_record(new)) for old, new in records["modified"]],
+        )
+
+
+def _pair_changes(added: List[ScheduleEvent], removed: List[ScheduleEvent], key, modified: list):
+    """key が一致する追加・削除の組を「変更」として modified に移す"""
+    removed_by_key: Dict[tuple, List[ScheduleEvent]] = {}
+    for event in removed:
+        removed_by_key.setdefault(key(event), []).append(event)
+    remaining_added = []
+    for event in added:
+        candidates = removed_by_key.get(key(event))
+        if candidates:
+            modified.append((candidates.pop(0), event))
+        else:
+            remaining_added.append(event)
+    remaining_removed = [event for events in removed_by_key.values() for event in events]
+    return remaining_added, remaining_removed
+
+
+DATABASE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id     TEXT PRIMARY KEY,
+    username    TEXT NOT NULL,
+    added_at    TEXT NOT NULL,
+    snapshot_at TEXT,           -- 最後に予定を記録した日時（NULL なら未取得）
+    legacy_hash TEXT,           -- v7.0.0 の previous_data.json から移行したハッシュ
+    check_interval  REAL,       -- 変更頻度に応じて調整されたチェック間隔（秒）
+    pinned_interval REAL,       -- 管理者が固定したチェック間隔（秒）
+    next_due        REAL,       -- 次回チェック予定（UNIXタイム）
+    page_digest     TEXT,       -- 前回解析したページの ccexp 部分のハッシュ
+    etag            TEXT,
+    last_modified   TEXT
+);
+CREATE TABLE IF NOT EXISTS events (
+    user_id     TEXT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    fingerprint TEXT NOT NULL,
+    event_date  TEXT NOT NULL,
+    event_time  TEXT NOT NULL,
+    text        TEXT NOT NULL,
+    div_id      TEXT NOT NULL,
+    PRIMARY KEY (user_id, fingerprint)
+);
+CREATE TABLE IF NOT EXISTS history (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id     TEXT NOT NULL,
+    detected_at TEXT NOT NULL,
+    change_type TEXT NOT NULL,  -- added / removed / modified
+    event_date  TEXT NOT NULL,
+    event_time  TEXT NOT NULL,
+    text        TEXT NOT NULL,
+    old_date    TEXT,
+    old_time    TEXT,
+    old_text    TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_history_user ON history (user_id, id);
+CREATE TABLE IF NOT EXISTS subscriptions (
+    user_id     TEXT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    channel_id  INTEGER NOT NULL,
+    guild_id    INTEGER,        -- NULL は config.NOTIFICATION_CHANNEL_ID から移行したもの
+    added_at    TEXT NOT NULL,
+    PRIMARY KEY (user_id, channel_id)
+);
+CREATE TABLE IF NOT EXISTS default_channels (
+    guild_id    INTEGER PRIMARY KEY,  -- !setchannel で設定したサーバーごとの通知チャンネル
+    channel_id  INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    user_id     TEXT PRIMARY KEY REFERENCES users(user_id) ON DELETE CASCADE,
+    worker_id   TEXT NOT NULL,  -- 取得ワーカー（python bot.py --worker）の識別名
+    expires_at  REAL NOT NULL   -- 貸し出しの期限（UNIXタイム）。過ぎたら他のワーカーが借り直せる
+);
+CREATE TABLE IF NOT EXISTS results (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id     TEXT NOT NULL,
+    worker_id   TEXT NOT NULL,
+    checked_at  TEXT NOT NULL,
+    status      TEXT NOT NULL,  -- changed / unchanged / failed / skipped
+    changes     TEXT            -- 変更内容（JSON、changed のときのみ）
+);
+
+-- 取得ワーカー（別プロセス）で共有するアクセス頻度制限のトークンバケット
+CREATE TABLE IF NOT EXISTS rate_limits (
+    name        TEXT PRIMARY KEY,
+    tokens      REAL NOT NULL,
+    updated_at  REAL NOT NULL   -- UNIX時刻
+);
+"""
+
+# 既存のデータベースに後から追加した列
+USERS_COLUMN_UPGRADES = {
+    "check_interval": "REAL",
+    "pinned_interval": "REAL",
+    "next_due": "REAL",
+    "page_digest": "TEXT",
+    "etag": "TEXT",
+    "last_modified": "TEXT",
+}
+
+
+class HistoryEntry(NamedTuple):
+    """予定の変更履歴1件"""
+    user_id: str
+    detected_at: datetime
+    change_type: str
+    event: ScheduleEvent
+    old_event: Optional[ScheduleEvent]
+
+
+class LeasedUser(NamedTuple):
+    """取得ワーカーが借りたユーザーと、借りた時点のチェック間隔・ページの指紋"""
+    user_id: str
+    username: str
+    interval: Optional[float]
+    pinned: Optional[float]
+    fingerprint: Optional[PageFingerprint]
+
+
+class WorkerResult(NamedTuple):
+    """取得ワーカーのチェック結果1件"""
+    user_id: str
+    worker_id: str
+    status: str
+    changes: Optional[ScheduleChanges]
 
-    def save_debug_screenshot(self, name_prefix: str):
+
+class DataManager:
+    """監視ユーザー・前回の予定・変更履歴の永続化（SQLite / WALモード）
+
+    書き込みは変化した行だけを対象にし、1回のチェック結果は1トランザクションで反映する。
+    v7.0.0 の users.json / previous_data.json は初回起動時に自動で取り込む。
+    起動後のデータベース操作は run() 経由で専用スレッド（1本）から行う。
+    """
+
+    def __init__(self, db_file, data_file=None, users_file=None):
+        self.db_file = db_file
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="freecal-db")
+        # 取得ワーカー（別プロセス）と共有する場合があるため、書き込みの競合は待って再試行する
+        self.conn = sqlite3.connect(db_file, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(DATABASE_SCHEMA)
+        self._upgrade_schema()
+        self._migrate_json(data_file, users_file)
+        self.monitored_users: Dict[str, str] = dict(
+            self.conn.execute("SELECT user_id, username FROM users ORDER BY added_at, user_id")
+        )
+        # 監視ユーザーごとの通知先チャンネル
+        self.subscriptions: Dict[str, set] = {}
+        for user_id, channel_id in self.conn.execute("SELECT user_id, channel_id FROM subscriptions"):
+            self.subscriptions.setdefault(user_id, set()).add(channel_id)
+        self.default_channels: Dict[int, int] = dict(
+            self.conn.execute("SELECT guild_id, channel_id FROM default_channels")
+        )
+
+    def _load_json(self, file_path: str) -> Dict:
         try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = os.path.join(SCREENSHOTS_DIR, f"debug_{name_prefix}_{timestamp}.png")
-            self.driver.save_screenshot(filename)
-            logger.info(f"スクリーンショットを保存しました: {filename}")
-        except Exception as e:
-            logger.error(f"スクリーンショットの保存に失敗: {e}")
+            if file_path and os.path.exists(file_path):
+                with open(file_path, 'r', encoding='utf-8') as f: 
+                    return json.load(f)
+        except (json.JSONDecodeError, IOError): 
+            pass
+        return {}
+
+    def _upgrade_schema(self):
+        existing = {row[1] for row in self.conn.execute("PRAGMA table_info(users)")}
+        with self.conn:
+            for column, column_type in USERS_COLUMN_UPGRADES.items():
+                if column not in existing:
+                    self.conn.execute(f"ALTER TABLE users ADD COLUMN {column} {column_type}")
+
+    def _migrate_json(self, data_file: Optional[str], users_file: Optional[str]):
+        """空のデータベースに v7.0.0 のJSONファイルを取り込み、元ファイルは .migrated に改名する"""
+        if self.conn.execute("SELECT 1 FROM users LIMIT 1").fetchone():
+            return
+        users = self._load_json(users_file)
+        if not users:
+            return
+        previous = self._load_json(data_file)
+        now = datetime.now().isoformat(timespec='seconds')
+        with self.conn:
+            for user_id, username in users.items():
+                snapshot = previous.get(user_id)
+                legacy_hash = snapshot if isinstance(snapshot, str) else None
+                snapshot_at = now if isinstance(snapshot, dict) else None
+                self.conn.execute(
+                    "INSERT INTO users (user_id, username, added_at, snapshot_at, legacy_hash) VALUES (?, ?, ?, ?, ?)",
+                    (user_id, username, now, snapshot_at, legacy_hash),
+                )
+                if isinstance(snapshot, dict):
+                    self.conn.executemany(
+                        "INSERT OR IGNORE INTO events VALUES (?, ?, ?, ?, ?, ?)",
+                        [(user_id, fp, *record) for fp, record in snapshot.items()],
+                    )
+        for file_path in (users_file, data_file):
+            if file_path and os.path.exists(file_path):
+                os.replace(file_path, file_path + ".migrated")
+        logger.info(f"JSONファイルから {len(users)}人分のデータを {self.db_file} に移行しました。")
+
+    async def run(self, func, *args):
+        """データベース操作をイベントループ外の専用スレッドで実行する"""
+        return await asyncio.get_event_loop().run_in_executor(self._executor, functools.partial(func, *args))
+
+    def save_all_data(self):
+        """未反映の書き込みを確定する（各操作は個別にコミット済み）"""
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+        self._executor.shutdown(wait=False)
+
+    def _load_snapshot(self, user_id: str) -> Optional[Dict[str, ScheduleEvent]]:
+        """前回の予定を返す（未取得なら None、v7.0.0 のハッシュだけが移行済みなら False）"""
+        row = self.conn.execute(
+            "SELECT snapshot_at, legacy_hash FROM users WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if row is None or row[0] is None:
+            return False if row and row[1] else None
+        rows = self.conn.execute(
+            "SELECT fingerprint, event_date, event_time, text, div_id FROM events WHERE user_id = ?",
+            (user_id,),
+        )
+        return {fp: ScheduleEvent.from_record(list(record)) for fp, *record in rows}
+
+    def load_events(self, user_id: str) -> Optional[List[ScheduleEvent]]:
+        """記録済みの予定を日付順で返す（未記録なら None）"""
+        snapshot = self._load_snapshot(user_id)
+        if snapshot is None or snapshot is False:
+            return None
+        return sorted(snapshot.values(), key=lambda event: event.sort_key)
+
+    def load_all_events(self) -> Dict[str, List[ScheduleEvent]]:
+        """予定を記録済みの全ユーザーの予定を返す（日付別インデックスの構築用）"""
+        snapshots: Dict[str, List[ScheduleEvent]] = {
+            user_id: [] for (user_id,) in self.conn.execute("SELECT user_id FROM users WHERE snapshot_at IS NOT NULL")
+        }
+        rows = self.conn.execute(
+            "SELECT e.user_id, e.event_date, e.event_time, e.text, e.div_id "
+            "FROM events e JOIN users u ON u.user_id = e.user_id WHERE u.snapshot_at IS NOT NULL"
+        )
+        for user_id, *record in rows:
+            snapshots[user_id].append(ScheduleEvent.from_record(record))
+        return snapshots
+
+    def load_page_fingerprints(self, user_ids: Optional[List[str]] = None) -> Dict[str, PageFingerprint]:
+        """記録済みのページの指紋（user_ids を渡すとそのユーザーの分だけ）"""
+        query = "SELECT user_id, page_digest, etag, last_modified FROM users WHERE page_digest IS NOT NULL"
+        params: tuple = ()
+        if user_ids is not None:
+            query += f" AND user_id IN ({', '.join('?' * len(user_ids))})"
+            params = tuple(user_ids)
+        rows = self.conn.execute(query, params)
+        return {user_id: PageFingerprint(*fingerprint) for user_id, *fingerprint in rows}
+
+    def save_page_fingerprints(self, fingerprints: Dict[str, PageFingerprint]):
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE users SET page_digest = ?, etag = ?, last_modified = ? WHERE user_id = ?",
+                [(*fingerprint, user_id) for user_id, fingerprint in fingerprints.items()],
+            )
+
+    def compute_changes(self, user_id: str, events: List[ScheduleEvent],
+                        fingerprint: Optional[PageFingerprint] = None) -> ScheduleChanges:
+        """前回の予定と比較して差分を返し、今回の予定を前回データとして記録する
+
+        予定を解析したページの指紋（fingerprint）も同じトランザクションで記録する（None なら消す）。
+        日付が過ぎて一覧から消えただけの予定は削除として扱わない。
+        時刻が同じで内容が違う予定、または同じ日の同じ内容で時刻が違う予定は「変更」とする。
+        """
+        current = {event.fingerprint: event for event in events}
+        previous = self._load_snapshot(user_id)
+
+        if previous is None:
+            # 初回は全予定を追加として扱う
+            changes = ScheduleChanges(list(current.values()), [], [])
+            stale = []
+        elif previous is False:
+            logger.info(f"{user_id} の前回データを新形式に移行しました（今回は通知しません）。")
+            changes = ScheduleChanges([], [], [])
+            stale = []
+            previous = {}
+        else:
+            today = datetime.now().date()
+            added = [event for fp, event in current.items() if fp not in previous]
+            stale = [fp for fp in previous if fp not in current]
+            removed = [previous[fp] for fp in stale if previous[fp].date >= today]
+            modified: List[Tuple[ScheduleEvent, ScheduleEvent]] = []
+            if added and removed:
+                added, removed = _pair_changes(added, removed, lambda event: event.slot, modified)
+                added, removed = _pair_changes(added, removed, lambda event: (event.date, event.text), modified)
+            changes = ScheduleChanges(added, removed, modified)
+
+        new_rows = [
+            (user_id, fp, *event.to_record())
+            for fp, event in current.items() if not previous or fp not in previous
+        ]
+        self._write_snapshot(user_id, new_rows, stale, changes, fingerprint or PageFingerprint(None))
+        return changes
+
+    def _write_snapshot(self, user_id: str, new_rows: list, stale: List[str], changes: ScheduleChanges,
+                        fingerprint: PageFingerprint):
+        now = datetime.now().isoformat(timespec='seconds')
+        history = [
+            (user_id, now, "added", *event.to_record()[:3], None, None, None)
+            for event in changes.added
+        ] + [
+            (user_id, now, "removed", *event.to_record()[:3], None, None, None)
+            for event in changes.removed
+        ] + [
+            (user_id, now, "modified", *new.to_record()[:3], *old.to_record()[:3])
+            for old, new in changes.modified
+        ]
+        with self.conn:
+            if stale:
+                self.conn.executemany(
+                    "DELETE FROM events WHERE user_id = ? AND fingerprint = ?",
+                    [(user_id, fp) for fp in stale],
+                )
+            if new_rows:
+                self.conn.executemany(
+                    "INSERT INTO events (user_id, fingerprint, event_date, event_time, text, div_id) "
+                    "VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (user_id, fingerprint) DO UPDATE SET div_id = excluded.div_id",
+                    new_rows,
+                )
+            if history:
+                self.conn.executemany(
+                    "INSERT INTO history (user_id, detected_at, change_type, event_date, event_time, text, "
+                    "old_date, old_time, old_text) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    history,
+                )
+            self.conn.execute(
+                "UPDATE users SET snapshot_at = ?, legacy_hash = NULL, page_digest = ?, etag = ?, last_modified = ? "
+                "WHERE user_id = ?",
+                (now, *fingerprint, user_id),
+            )
+
+    def get_history(self, user_id: Optional[str] = None, limit: int = 20) -> List[HistoryEntry]:
+        """新しい順に変更履歴を返す（user_id 省略時は全ユーザー）"""
+        query = (
+            "SELECT user_id, detected_at, change_type, event_date, event_time, text, "
+            "old_date, old_time, old_text FROM history"
+        )
+        params: tuple = ()
+        if user_id:
+            query += " WHERE user_id = ?"
+            params = (user_id,)
+        query += " ORDER BY id DESC LIMIT ?"
+        entries = []
+        for uid, detected_at, change_type, *record in self.conn.execute(query, params + (limit,)):
+            event = ScheduleEvent.from_record(record[:3] + [""])
+            old_event = ScheduleEvent.from_record(record[3:] + [""]) if record[3] else None
+            entries.append(HistoryEntry(uid, datetime.fromisoformat(detected_at), change_type, event, old_event))
+        return entries
+
+    def load_schedule_states(self) -> Dict[str, Tuple[Optional[float], Optional[float], Optional[float]]]:
+        """{user_id: (調整後の間隔, 固定間隔, 次回予定)} を返す"""
+        rows = self.conn.execute("SELECT user_id, check_interval, pinned_interval, next_due FROM users")
+        return {user_id: tuple(state) for user_id, *state in rows}
+
+    def save_schedule_state(self, user_id: str, interval: float, pinned: Optional[float], next_due: float):
+        with self.conn:
+            self.conn.execute(
+                "UPDATE users SET check_interval = ?, pinned_interval = ?, next_due = ? WHERE user_id = ?",
+                (interval, pinned, next_due, user_id),
+            )
+
+    def claim_users(self, worker_id: str, limit: int, lease_seconds: float) -> List[LeasedUser]:
+        """チェック時刻を過ぎていて、他のワーカーが借りていないユーザーを期限付きで借りる
+
+        期限切れの貸し出し（止まったワーカーの分など）は借り直す。複数のプロセスが同時に
+        呼んでも同じユーザーを借りないよう、読み取りと貸し出しは1つの書き込みトランザクションで行う。
+        """
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self.conn.execute(
+                "SELECT u.user_id, u.username, u.check_interval, u.pinned_interval, "
+                "u.page_digest, u.etag, u.last_modified "
+                "FROM users u LEFT JOIN leases l ON l.user_id = u.user_id "
+                "WHERE COALESCE(u.next_due, 0) <= ? AND (l.user_id IS NULL OR l.expires_at <= ?) "
+                "ORDER BY COALESCE(u.next_due, 0) LIMIT ?",
+                (now, now, limit),
+            ).fetchall()
+            self.conn.executemany(
+                "INSERT INTO leases (user_id, worker_id, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (user_id) DO UPDATE SET worker_id = excluded.worker_id, expires_at = excluded.expires_at",
+                [(row[0], worker_id, now + lease_seconds) for row in rows],
+            )
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            raise
+        return [
+            LeasedUser(user_id, username, interval, pinned, PageFingerprint(*fingerprint) if fingerprint[0] else None)
+            for user_id, username, interval, pinned, *fingerprint in rows
+        ]
+
+    def take_token(self, name: str, rate: float, capacity: float) -> float:
+        """共有のトークンバケットから1つ取り出す（取り出せたら 0、足りなければ待つべき秒数）"""
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute("SELECT tokens, updated_at FROM rate_limits WHERE name = ?", (name,)).fetchone()
+            tokens = capacity if row is None else min(capacity, row[0] + max(0.0, now - row[1]) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            self.conn.execute(
+                "INSERT INTO rate_limits (name, tokens, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+                (name, tokens, now),
+            )
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            raise
+        return wait
+
+    def renew_lease(self, user_id: str, worker_id: str, lease_seconds: float) -> bool:
+        """貸し出しの期限を延ばす（既に他のワーカーに借り直されていたら False）"""
+        with self.conn:
+            cursor = self.conn.execute(
+                "UPDATE leases SET expires_at = ? WHERE user_id = ? AND worker_id = ?",
+                (time.time() + lease_seconds, user_id, worker_id),
+            )
+        return cursor.rowcount == 1
+
+    def finish_lease(self, user_id: str, worker_id: str, interval: float, next_due: float,
+                     fingerprint: Optional[PageFingerprint], status: str,
+                     changes: Optional[ScheduleChanges]) -> bool:
+        """次回のチェック時刻とページの指紋を保存し、結果を results に書いて貸し出しを返す
+
+        既に他のワーカーに借り直されていた場合は何もせず False を返す。
+        固定間隔（!pin）は Discord 側で変更されるため、ここでは書き換えない。
+        """
+        fingerprint = fingerprint or PageFingerprint(None, None, None)
+        with self.conn:
+            cursor = self.conn.execute(
+                "DELETE FROM leases WHERE user_id = ? AND worker_id = ?", (user_id, worker_id)
+            )
+            if cursor.rowcount != 1:
+                return False
+            self.conn.execute(
+                "UPDATE users SET check_interval = ?, next_due = ?, page_digest = ?, etag = ?, last_modified = ? "
+                "WHERE user_id = ?",
+                (interval, next_due, *fingerprint, user_id),
+            )
+            self.conn.execute(
+                "INSERT INTO results (user_id, worker_id, checked_at, status, changes) VALUES (?, ?, ?, ?, ?)",
+                (
+                    user_id, worker_id, datetime.now().isoformat(timespec='seconds'), status,
+                    json.dumps(changes.to_records(), ensure_ascii=False) if changes else None,
+                ),
+            )
+        return True
+
+    def release_leases(self, worker_id: str):
+        """ワーカーの終了時に、借りたままのユーザーを返す"""
+        with self.conn:
+            self.conn.execute("DELETE FROM leases WHERE worker_id = ?", (worker_id,))
+
+    def active_leases(self) -> Dict[str, int]:
+        """取得ワーカーごとの貸し出し中（期限内）の人数"""
+        rows = self.conn.execute(
+            "SELECT worker_id, COUNT(*) FROM leases WHERE expires_at > ? GROUP BY worker_id ORDER BY worker_id",
+            (time.time(),),
+        )
+        return dict(rows)
+
+    def take_results(self, limit: int = 500) -> List[WorkerResult]:
+        """取得ワーカーの結果を古い順に取り出す（取り出した結果は削除する）"""
+        with self.conn:
+            rows = self.conn.execute(
+                "SELECT id, user_id, worker_id, status, changes FROM results ORDER BY id LIMIT ?", (limit,)
+            ).fetchall()
+            if rows:
+                self.conn.execute("DELETE FROM results WHERE id <= ?", (rows[-1][0],))
+        return [
+            WorkerResult(user_id, worker_id, status, ScheduleChanges.from_records(json.loads(changes)) if changes else None)
+            for _, user_id, worker_id, status, changes in rows
+        ]
+
+    # 監視ユーザー・通知先の変更は、データベースへの書き込みだけを run() で専用スレッドに任せ、
+    # メモリ上の一覧（monitored_users など）は書き込み後にイベントループ側で更新する。
+    # 一覧は定期チェックやコマンドがイベントループ上で走査しているため、別スレッドから変更しない。
+
+    async def add_user(self, user_id: str, username: str):
+        await self.run(self._insert_user, user_id, username, datetime.now().isoformat(timespec='seconds'))
+        self.monitored_users[user_id] = username
+
+    def _insert_user(self, user_id: str, username: str, added_at: str):
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO users (user_id, username, added_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (user_id) DO UPDATE SET username = excluded.username",
+                (user_id, username, added_at),
+            )
+
+    async def remove_user(self, user_id: str) -> Optional[str]:
+        if user_id not in self.monitored_users:
+            return None
+        await self.run(self._delete_user, user_id)
+        self.subscriptions.pop(user_id, None)
+        return self.monitored_users.pop(user_id, None)
+
+    def _delete_user(self, user_id: str):
+        with self.conn:
+            self.conn.execute("DELETE FROM users WHERE user_id = ?", (user_id,))
+
+    def subscribers(self, user_id: str) -> set:
+        return self.subscriptions.get(user_id, set())
+
+    async def subscribe(self, user_ids: List[str], channel_id: int, guild_id: Optional[int]) -> int:
+        """チャンネルに監視ユーザーの通知を登録し、新たに登録した人数を返す"""
+        new_ids = [uid for uid in user_ids if channel_id not in self.subscribers(uid)]
+        await self.run(self._insert_subscriptions, new_ids, channel_id, guild_id)
+        self._add_subscriptions(new_ids, channel_id)
+        return len(new_ids)
+
+    def _insert_subscriptions(self, user_ids: List[str], channel_id: int, guild_id: Optional[int]):
+        now = datetime.now().isoformat(timespec='seconds')
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO subscriptions (user_id, channel_id, guild_id, added_at) VALUES (?, ?, ?, ?)",
+                [(uid, channel_id, guild_id, now) for uid in user_ids],
+            )
+
+    def _add_subscriptions(self, user_ids: List[str], channel_id: int):
+        for uid in user_ids:
+            self.subscriptions.setdefault(uid, set()).add(channel_id)
+
+    async def unsubscribe(self, user_ids: List[str], channel_id: int) -> int:
+        """チャンネルから監視ユーザーの通知を解除し、解除した人数を返す"""
+        removed_ids = [uid for uid in user_ids if channel_id in self.subscribers(uid)]
+        await self.run(self._delete_subscriptions, removed_ids, channel_id)
+        for uid in removed_ids:
+            self.subscriptions.get(uid, set()).discard(channel_id)
+        return len(removed_ids)
+
+    def _delete_subscriptions(self, user_ids: List[str], channel_id: int):
+        with self.conn:
+            self.conn.executemany(
+                "DELETE FROM subscriptions WHERE user_id = ? AND channel_id = ?",
+                [(uid, channel_id) for uid in user_ids],
+            )
+
+    async def set_default_channel(self, guild_id: int, channel_id: int):
+        await self.run(self._save_default_channel, guild_id, channel_id)
+        self.default_channels[guild_id] = channel_id
+
+    def _save_default_channel(self, guild_id: int, channel_id: int):
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO default_channels (guild_id, channel_id) VALUES (?, ?) "
+                "ON CONFLICT (guild_id) DO UPDATE SET channel_id = excluded.channel_id",
+                (guild_id, channel_id),
+            )
+
+    def import_legacy_channel(self, channel_id: Optional[int]):
+        """config.NOTIFICATION_CHANNEL_ID の設定を、通知先が1件も無い場合に限り全員分の通知先として取り込む"""
+        # 起動時（定期チェック開始前）にだけ呼ぶため、イベントループ上で直接書き込む
+        if channel_id and not any(self.subscriptions.values()) and self.monitored_users:
+            user_ids = list(self.monitored_users)
+            self._insert_subscriptions(user_ids, channel_id, None)
+            self._add_subscriptions(user_ids, channel_id)
+            logger.info(f"config.NOTIFICATION_CHANNEL_ID ({channel_id}) を全員分の通知先として登録しました。")
+
+
+def normalize_name(text: str) -> str:
+    """検索用に名前を正規化する（全角/半角・大文字/小文字・カタカナ/ひらがな・空白の違いを無視）"""
+    text = unicodedata.normalize('NFKC', text).casefold()
+    return "".join(
+        chr(ord(c) - 0x60) if 'ァ' <= c <= 'ヶ' else c
+        for c in text if not c.isspace()
+    )
+
+
+class UserIndex:
+    """監視ユーザー名の検索インデックス
+
+    正規化した名前の整列済みリスト（前方一致を二分探索）と、1文字・2文字の n-gram から
+    ユーザーIDへの転置インデックス（部分一致の候補絞り込み）を持つ。
+    """
+
+    def __init__(self, users: Dict[str, str]):
+        self.names: Dict[str, Tuple[str, str]] = {}  # user_id -> (表示名, 正規化した名前)
+        self._sorted: List[Tuple[str, str]] = []     # (正規化した名前, user_id)
+        self._grams: Dict[str, set] = {}
+        for user_id, name in users.items():
+            self.add(user_id, name)
+
+    @staticmethod
+    def _ngrams(key: str) -> set:
+        return set(key) | {key[i:i + 2] for i in range(len(key) - 1)}
+
+    def add(self, user_id: str, name: str):
+        self.remove(user_id)
+        key = normalize_name(name)
+        self.names[user_id] = (name, key)
+        bisect.insort(self._sorted, (key, user_id))
+        for gram in self._ngrams(key):
+            self._grams.setdefault(gram, set()).add(user_id)
+
+    def remove(self, user_id: str):
+        if user_id not in self.names:
+            return
+        _, key = self.names.pop(user_id)
+        self._sorted.remove((key, user_id))
+        for gram in self._ngrams(key):
+            self._grams[gram].discard(user_id)
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[Tuple[str, str]]:
+        """(user_id, 表示名) を完全一致 → 前方一致 → 部分一致の順に返す（空の検索語なら全員）"""
+        key = normalize_name(query)
+        if not key:
+            matches = [user_id for _, user_id in self._sorted]
+            return [(uid, self.names[uid][0]) for uid in matches[:limit]]
+
+        exact, prefix = [], []
+        position = bisect.bisect_left(self._sorted, (key, ""))
+        while position < len(self._sorted) and self._sorted[position][0].startswith(key):
+            name_key, user_id = self._sorted[position]
+            (exact if name_key == key else prefix).append(user_id)
+            position += 1
+
+        found = set(exact) | set(prefix)
+        grams = sorted((self._grams.get(gram, set()) for gram in self._ngrams(key)), key=len)
+        candidates = set.intersection(*grams) - found if grams else set()
+        partial = sorted(
+            (uid for uid in candidates if key in self.names[uid][1]),
+            key=lambda uid: self.names[uid][1],
+        )
+        matches = exact + prefix + partial
+        return [(uid, self.names[uid][0]) for uid in matches[:limit]]
 
-    def cleanup(self):
-        if self.driver: 
-            self.driver.quit()
-        self.is_initialized = False
+    def resolve(self, target: str) -> List[Tuple[str, str]]:
+        """ユーザーIDか名前から候補を返す（IDや名前が完全に一致すればその人だけ）"""
+        target = target.strip()
+        if target in self.names:
+            return [(target, self.names[target][0])]
+        matches = self.search(target)
+        key = normalize_name(target)
+        exact = [match for match in matches if self.names[match[0]][1] == key]
+        return exact or matches
 
 
-class DataManager:
-    def __init__(self, data_file, users_file):
-        self.data_file = data_file
-        self.users_file = users_file
-        self.previous_hashes: Dict[str, str] = self._load_json(self.data_file)
-        self.monitored_users: Dict[str, str] = self._load_json(self.users_file)
+class UserListView(discord.ui.View):
+    """監視ユーザー一覧のページ送り"""
 
-    def _load_json(self, file_path: str) -> Dict:
-        try:
-            if os.path.exists(file_path):
-                with open(file_path, 'r', encoding='utf-8') as f: 
-                    return json.load(f)
-        except (json.JSONDecodeError, IOError): 
-            pass
-        return {}
+    def __init__(self, users: List[Tuple[str, str]], page: int = 0):
+        super().__init__(timeout=180)
+        self.users = users
+        self.pages = max(1, math.ceil(len(users) / USER_LIST_PAGE_SIZE))
+        self.page = min(max(page, 0), self.pages - 1)
+        self._update_buttons()
 
-    def _save_json(self, file_path: str, data: Dict):
-        try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=4)
-        except IOError as e:
-            logger.error(f"{file_path} への書き込みエラー: {e}")
+    def build_embed(self) -> discord.Embed:
+        start = self.page * USER_LIST_PAGE_SIZE
+        lines = [f"`{uid}`: **{name}**" for uid, name in self.users[start:start + USER_LIST_PAGE_SIZE]]
+        embed = discord.Embed(
+            title=f"📋 監視ユーザー一覧（{len(self.users)}人）",
+            description="\n".join(lines),
+            color=0x0099ff
+        )
+        embed.set_footer(
+            text=f"{self.page + 1}/{self.pages}ページ ・ 使い方: !check [名前] で今日の予定、!calendar [名前] で全予定"
+        )
+        return embed
 
-    def save_all_data(self):
-        self._save_json(self.data_file, self.previous_hashes)
-        self._save_json(self.users_file, self.monitored_users)
+    def _update_buttons(self):
+        self.previous_page.disabled = self.page == 0
+        self.next_page.disabled = self.page >= self.pages - 1
 
-    def has_changed(self, user_id: str, current_data: str) -> bool:
-        current_hash = hashlib.md5(current_data.encode('utf-8')).hexdigest()
-        if self.previous_hashes.get(user_id) != current_hash:
-            self.previous_hashes[user_id] = current_hash
-            return True
-        return False
+    async def _show(self, interaction: discord.Interaction, page: int):
+        self.page = page
+        self._update_buttons()
+        await interaction.response.edit_message(embed=self.build_embed(), view=self)
 
-    def add_user(self, user_id: str, username: str):
-        self.monitored_users[user_id] = username
-        self._save_json(self.users_file, self.monitored_users)
+    @discord.ui.button(label="◀ 前へ", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.page - 1)
 
-    def remove_user(self, user_id: str) -> Optional[str]:
-        if user_id in self.monitored_users:
-            username = self.monitored_users.pop(user_id)
-            self._save_json(self.users_file, self.monitored_users)
-            return username
-        return None
+    @discord.ui.button(label="次へ ▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.page + 1)
 
 
 class CalendarMonitor(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.scraper = FreecalendScraper()
-        self.data_manager = DataManager(PREVIOUS_DATA_FILE, USERS_FILE)
-        self.notification_channel_id = config.NOTIFICATION_CHANNEL_ID
+        self.data_manager = DataManager(DATABASE_FILE, PREVIOUS_DATA_FILE, USERS_FILE)
+        self.data_manager.import_legacy_channel(getattr(config, 'NOTIFICATION_CHANNEL_ID', None))
+        self.user_index = UserIndex(self.data_manager.monitored_users)
+        self.rate_limiter = create_rate_limiter()
+        self.outbox = create_outbox()
+        # コマンドでの取得で見つかった変更の送信キュー（定期チェックの送信キュー・集計とは分け、
+        # Discord への送信頻度の制限だけを共有する）
+        self.command_outbox = NotificationOutbox(self.outbox.rate_limiter, self.outbox.max_retries)
+        self.cache = ScheduleCache(
+            self.scraper,
+            ttl_seconds=getattr(config, 'SCHEDULE_CACHE_TTL_MINUTES', 10) * 60,
+            stale_seconds=getattr(config, 'SCHEDULE_CACHE_STALE_MINUTES', 720) * 60,
+            snapshot_loader=functools.partial(self.data_manager.run, self.data_manager.load_events),
+        )
+        self.scraper.fingerprints = self.data_manager.load_page_fingerprints()
+        self.event_index = EventIndex(self.data_manager.load_all_events())
+        self.scheduler = create_scheduler()
+        self.lag_monitor = LoopLagMonitor(
+            LOOP_LAG_INTERVAL_SECONDS, getattr(config, 'LOOP_LAG_WARN_SECONDS', 0.25)
+        )
+        self._metrics_runner: Optional[web.AppRunner] = None
+        self._warm_up_task: Optional[asyncio.Task] = None
+        # True なら取得は取得ワーカー（python bot.py --worker）に任せ、結果の通知だけを行う
+        self.sharded = getattr(config, 'SHARDED_WORKERS', False)
+        self._first_command_answered = False
+        self._skipping_no_channel = False  # 通知チャンネル未設定でスキップ中（ログを1回だけ出す）
+        self._load_schedule()
         self.schedule_check.start()
 
-    def cog_unload(self):
+    async def cog_load(self):
+        self.lag_monitor.start()
+        await self._adopt_legacy_channel()
+        await self._start_metrics_server()
+        self._warm_up_task = asyncio.create_task(self._warm_up())
+
+    async def _adopt_legacy_channel(self):
+        """config.NOTIFICATION_CHANNEL_ID のサーバーに既定の通知チャンネルが無ければ、そのチャンネルを既定にする
+
+        旧設定から移行した環境でも、!adduser で追加したユーザーの通知がこのチャンネルに届くようにする。
+        チャンネルのサーバーはログイン後（on_ready）でないと分からないため、ここで行う。
+        """
+        channel_id = getattr(config, 'NOTIFICATION_CHANNEL_ID', None)
+        channel = self.bot.get_channel(channel_id) if channel_id else None
+        guild = getattr(channel, 'guild', None)
+        if guild is None:
+            if channel_id:
+                logger.warning(f"config.NOTIFICATION_CHANNEL_ID ({channel_id}) のチャンネルが見つかりません。")
+            return
+        if guild.id not in self.data_manager.default_channels:
+            await self.data_manager.set_default_channel(guild.id, channel.id)
+            logger.info(f"config.NOTIFICATION_CHANNEL_ID ({channel.id}) を {guild.name} の既定の通知チャンネルにしました。")
+
+    async def _warm_up(self):
+        """ログイン直後にバックグラウンドで取得の準備を済ませる（WARMUP_DRIVERS = 0 で Chrome の先行起動なし）"""
+        try:
+            await self.scraper.warm_up(getattr(config, 'WARMUP_DRIVERS', 1))
+        except Exception as e:
+            logger.warning(f"取得の事前準備に失敗しました: {e}", exc_info=True)
+            return
+        record_startup("warmup", "取得の事前準備完了")
+
+    async def _start_metrics_server(self):
+        """METRICS_PORT が設定されていれば /metrics（Prometheus 形式）を公開する"""
+        port = getattr(config, 'METRICS_PORT', None)
+        if not port:
+            return
+        host = getattr(config, 'METRICS_HOST', '127.0.0.1')
+        app = web.Application()
+        app.router.add_get('/metrics', self._serve_metrics)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        try:
+            await web.TCPSite(runner, host, port).start()
+        except OSError as e:
+            logger.error(f"メトリクス用ポート {host}:{port} を開けませんでした: {e}")
+            await runner.cleanup()
+            return
+        self._metrics_runner = runner
+        logger.info(f"メトリクスを http://{host}:{port}/metrics で公開しています。")
+
+    async def _serve_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(
+            text=metrics.render(), headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+        )
+
+    async def cog_before_invoke(self, ctx):
+        ctx.started_at = time.perf_counter()
+
+    async def cog_after_invoke(self, ctx):
+        started = getattr(ctx, 'started_at', None)
+        if started is not None:
+            metrics.observe("freecal_command_seconds", time.perf_counter() - started, command=ctx.command.name)
+        if not self._first_command_answered:
+            self._first_command_answered = True
+            record_startup("first_command", f"最初のコマンド応答（!{ctx.command.name}）")
+
+    def _load_schedule(self):
+        """保存済みの次回予定を読み込む（未設定のユーザーは最短間隔の中に均等に分散）"""
+        states = self.data_manager.load_schedule_states()
+        now = time.time()
+        new_users = [uid for uid in self.data_manager.monitored_users if states.get(uid, (None,) * 3)[2] is None]
+        for user_id in self.data_manager.monitored_users:
+            interval, pinned, next_due = states.get(user_id, (None, None, None))
+            if next_due is None:
+                next_due = now + self.scheduler.min_interval * new_users.index(user_id) / len(new_users)
+            self.scheduler.add(user_id, interval, pinned, next_due)
+
+    async def cog_unload(self):
         self.schedule_check.cancel()
-        self.scraper.cleanup()
-        self.data_manager.save_all_data()
+        self.lag_monitor.stop()
+        if self._warm_up_task and not self._warm_up_task.done():
+            self._warm_up_task.cancel()
+        if self._metrics_runner:
+            await self._metrics_runner.cleanup()
+        await self.scraper.close()
+        await self._save_page_fingerprints()
+        await self.data_manager.run(self.data_manager.save_all_data)
+        self.data_manager.close()
 
-    @tasks.loop(hours=config.CHECK_INTERVAL_HOURS)
+    @tasks.loop(seconds=getattr(config, 'SCHEDULER_TICK_SECONDS', 60))
     async def schedule_check(self):
-        if not self.notification_channel_id:
-            logger.warning("通知チャンネル未設定のため定期チェックをスキップします。")
+        """チェック時刻を迎えたユーザーだけをまとめてチェックする
+
+        各カレンダーは通知先の数に関係なく1回だけ取得し、変更は全ての通知先に送る。
+        SHARDED_WORKERS が有効な場合は自分では取得せず、取得ワーカーの結果を通知する。
+        """
+        if self.sharded:
+            await self._consume_worker_results()
             return
-        
-        channel = self.bot.get_channel(self.notification_channel_id)
-        if not channel:
-            logger.error(f"通知チャンネル(ID: {self.notification_channel_id})が見つかりません。")
+        if not any(self.data_manager.subscriptions.values()):
+            # 毎回の確認（SCHEDULER_TICK_SECONDS ごと）で繰り返さず、状態が変わった時だけログを出す
+            if not self._skipping_no_channel:
+                logger.warning("通知チャンネル未設定のため定期チェックをスキップします。")
+                self._skipping_no_channel = True
             return
+        if self._skipping_no_channel:
+            logger.info("通知チャンネルが設定されたため定期チェックを再開します。")
+            self._skipping_no_channel = False
         
-        logger.info("=== 定期チェック開始 ===")
-        users_to_check = self.data_manager.monitored_users.copy()
+        due_users = self.scheduler.pop_due()
+        if not due_users:
+            return
+
+        logger.info(f"=== 定期チェック開始 === 対象 {len(due_users)}人 / 待機中 {len(self.scheduler)}人")
+        queue: asyncio.Queue = asyncio.Queue()
+        for user_id in due_users:
+            username = self.data_manager.monitored_users.get(user_id)
+            if username:
+                queue.put_nowait((user_id, username))
+
+        stats = CycleStats()
+        self.lag_monitor.take()
+        workers = [
+            asyncio.create_task(self._check_worker(queue, stats))
+            for _ in range(min(self.scraper.pool_size, queue.qsize()))
+        ]
+        await asyncio.gather(*workers)
         
-        for user_id, username in users_to_check.items():
+        if len(self.outbox):
+            stats.notified = len(self.outbox)
+            stats.messages, stats.send_failures = await self.outbox.flush()
+        await self._save_page_fingerprints()
+        await self.data_manager.run(self.data_manager.save_all_data)
+        stats.loop_lag = self.lag_monitor.take()
+        logger.info(f"=== 定期チェック完了 === {stats.summary()}")
+
+    async def _check_worker(self, queue: asyncio.Queue, stats: CycleStats):
+        """キューからユーザーを取り出して順にチェックするワーカー"""
+        while True:
+            try:
+                user_id, username = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            # 失敗し続けているユーザー・サイト全体が止まっている間は、アクセス枠を使わずに延期する
+            retry_at = self.scraper.retry_at(user_id)
+            if retry_at is None:
+                await self.rate_limiter.acquire()
+                # アクセス枠を待つ間にサイト全体が止まった場合
+                retry_at = self.scraper.retry_at(user_id)
+            if retry_at is not None:
+                await self._defer(user_id, retry_at, stats)
+                if self.scraper.site_breaker.retry_at(SITE_KEY) is not None:
+                    # サイト全体が止まったら、残りのユーザーもまとめて延期してサイクルを終える
+                    while not queue.empty():
+                        user_id, _ = queue.get_nowait()
+                        await self._defer(user_id, self.scraper.retry_at(user_id) or retry_at, stats)
+                continue
+            started = time.monotonic()
+            changed: Optional[bool] = None
             try:
-                # 定期チェックは全予定を取得
-                schedule_data = await self.scraper.get_schedule(user_id, username, today_only=False)
-                if schedule_data is not None and self.data_manager.has_changed(user_id, schedule_data):
-                    logger.info(f"{username}のスケジュールが更新されました。")
-                    await self._send_notification(channel, username, schedule_data, user_id)
+                # 定期チェックは常に取得し直し、結果はコマンド用のキャッシュにも残る
+                entry = await self.cache.refresh(user_id, username)
+                stats.fetch_times.append(time.monotonic() - started)
+                stats.checked += 1
+                if entry is None:
+                    stats.failures += 1
+                    continue
+                if entry.unchanged:
+                    stats.unchanged += 1
+                    changed = False
+                    continue
+                changes = await self._record_changes(user_id, entry)
+                changed = bool(changes)
+                if changes:
+                    logger.info(f"{username}のスケジュールが更新されました。({changes.summary})")
+                    self._fan_out(user_id, self._build_notification_embeds(username, changes, user_id))
                 else:
                     logger.info(f"{username}のスケジュールに変更はありません。")
-                await asyncio.sleep(config.ACCESS_INTERVAL_SECONDS)
             except Exception as e:
+                stats.failures += 1
                 logger.error(f"{username}のチェック中にエラー: {e}", exc_info=True)
-        
-        self.data_manager.save_all_data()
-        logger.info("=== 定期チェック完了 ===")
+            finally:
+                await self._reschedule(user_id, changed)
+
+    async def _defer(self, user_id: str, retry_at: float, stats: CycleStats):
+        """取得を止めている間のユーザーを、間隔は変えずに再開時刻まで延期する"""
+        stats.deferred += 1
+        self.scheduler.defer(user_id, retry_at)
+        await self._save_schedule_state(user_id)
+
+    async def _consume_worker_results(self):
+        """取得ワーカーの結果を通知し、日付別インデックス・キャッシュ・次回予定に反映する"""
+        results = await self.data_manager.run(self.data_manager.take_results)
+        if not results:
+            return
+
+        failures = changed = deferred = 0
+        reload_users = set()
+        for result in results:
+            username = self.data_manager.monitored_users.get(result.user_id)
+            if username is None:
+                continue
+            if result.status == "failed":
+                failures += 1
+                continue
+            if result.status == "skipped":
+                deferred += 1
+                continue
+            if result.changes:
+                changed += 1
+                logger.info(f"{username}のスケジュールが更新されました。({result.changes.summary}) [{result.worker_id}]")
+                self._fan_out(result.user_id, self._build_notification_embeds(username, result.changes, result.user_id))
+            if result.changes or result.user_id not in self.event_index:
+                reload_users.add(result.user_id)
+
+        for user_id in reload_users:
+            # ワーカーが記録した最新の予定に合わせる（古いキャッシュはコマンドで返さない）
+            self.cache.invalidate(user_id)
+            events = await self.data_manager.run(self.data_manager.load_events, user_id)
+            if events is not None:
+                self.event_index.replace(user_id, events)
+        result_users = list({result.user_id for result in results})
+        # ページの指紋もワーカーが記録したものに合わせる（コマンドでの取得が、古い指紋で解析を省略しないように）
+        fingerprints = await self.data_manager.run(self.data_manager.load_page_fingerprints, result_users)
+        for user_id in result_users:
+            self.scraper.dirty_fingerprints.discard(user_id)
+            if user_id in fingerprints:
+                self.scraper.fingerprints[user_id] = fingerprints[user_id]
+            else:
+                self.scraper.fingerprints.pop(user_id, None)
+        states = await self.data_manager.run(self.data_manager.load_schedule_states)
+        for user_id in result_users:
+            if user_id in self.data_manager.monitored_users and user_id in states:
+                self.scheduler.add(user_id, *states[user_id])
+
+        notified, messages, send_failures = len(self.outbox), 0, 0
+        if notified:
+            messages, send_failures = await self.outbox.flush()
+        logger.info(
+            f"=== 取得ワーカーの結果を反映 === {len(results)}件 / 変更 {changed}人 / 失敗 {failures}件 / "
+            f"取得停止中で延期 {deferred}人 / "
+            f"通知 埋め込み {notified}件 → メッセージ {messages}通（送信失敗 {send_failures}通）"
+        )
+
+    def _fan_out(self, user_id: str, embeds: List[discord.Embed], outbox: Optional[NotificationOutbox] = None):
+        """通知を登録済みの全チャンネルの送信キュー（省略時は定期チェックのもの）に入れる"""
+        if outbox is None:
+            outbox = self.outbox
+        for channel_id in self.data_manager.subscribers(user_id):
+            channel = self.bot.get_channel(channel_id)
+            if channel:
+                outbox.add(channel, embeds)
+            else:
+                logger.error(f"通知チャンネル(ID: {channel_id})が見つかりません。")
+
+    async def _save_page_fingerprints(self):
+        dirty = self.scraper.dirty_fingerprints
+        if dirty:
+            # 消した指紋は NULL で上書きする
+            fingerprints = {uid: self.scraper.fingerprints.get(uid, PageFingerprint(None)) for uid in dirty}
+            dirty.clear()
+            await self.data_manager.run(self.data_manager.save_page_fingerprints, fingerprints)
+
+    async def _reschedule(self, user_id: str, changed: Optional[bool]):
+        if self.scheduler.reschedule(user_id, changed) is not None:
+            await self._save_schedule_state(user_id)
+
+    async def _save_schedule_state(self, user_id: str):
+        due = self.scheduler.next_due(user_id)
+        if due is not None:
+            await self.data_manager.run(
+                self.data_manager.save_schedule_state,
+                user_id, self.scheduler.intervals[user_id], self.scheduler.pinned.get(user_id), due
+            )
 
     @schedule_check.before_loop
     async def before_schedule_check(self):
         await self.bot.wait_until_ready()
 
-    async def _send_notification(self, channel, username, schedule_data, user_id):
-        """スケジュール更新通知を送信"""
-        embed = discord.Embed(
-            title=f"📅 {username}のスケジュール更新", 
-            color=discord.Color.gold(), 
-            timestamp=datetime.now()
+    def _build_notification_embeds(self, username, changes: ScheduleChanges, user_id) -> List[discord.Embed]:
+        """スケジュール更新通知（変化した予定のみ）"""
+        embeds = self._build_embeds(
+            f"📅 {username}のスケジュール更新", discord.Color.gold(), self._format_changes(changes), user_id
         )
-        embed.description = schedule_data[:4000] if schedule_data else "登録されている今後の予定はありません。"
-        
-        # フッター情報
+        embeds[-1].timestamp = datetime.now()
+        return embeds
+
+    @staticmethod
+    def _format_changes(changes: ScheduleChanges) -> str:
+        sections = []
+        if changes.added:
+            sections.append("**🆕 追加**\n" + format_events(sorted(changes.added, key=lambda e: e.sort_key)))
+        if changes.modified:
+            lines = [
+                f"{new.format()}\n　（変更前: {old.format().removeprefix('🔹 ')}）"
+                for old, new in sorted(changes.modified, key=lambda pair: pair[1].sort_key)
+            ]
+            sections.append("**✏️ 変更**\n" + "\n".join(lines))
+        if changes.removed:
+            lines = [f"~~{event.format()}~~" for event in sorted(changes.removed, key=lambda e: e.sort_key)]
+            sections.append("**🗑️ 削除**\n" + "\n".join(lines))
+        return "\n\n".join(sections)
+
+    def _build_today_embeds(self, user_id: str, username: str, events: List[ScheduleEvent]) -> List[discord.Embed]:
+        today_events = self.scraper.filter_today(events)
+        description = format_events(today_events) if today_events else "今日の予定はありません。"
+        return self._build_embeds(f"🔥 {username}の【今日の予定】", discord.Color.green(), description, user_id)
+
+    def _build_calendar_embeds(self, user_id: str, username: str, events: List[ScheduleEvent]) -> List[discord.Embed]:
+        schedule_data = format_events(upcoming_events(events))
+        description = schedule_data or "登録されている今後の予定はありません。"
+        return self._build_embeds(f"⏰ {username}の【今後の全予定】", discord.Color.blue(), description, user_id)
+
+    def _build_embeds(self, title: str, color, description: str, user_id: Optional[str]) -> List[discord.Embed]:
+        """説明文が長い場合は続きの埋め込みに分割する（共通フッターは最後の埋め込みに付ける。全員分なら付けない）"""
+        chunks = split_description(description) or [""]
+        embeds = [
+            discord.Embed(
+                title=title if page == 1 else f"{title}（続き {page}/{len(chunks)}）",
+                color=color,
+                description=chunk,
+            )
+            for page, chunk in enumerate(chunks, start=1)
+        ]
+        if user_id:
+            self._add_footer_fields(embeds[-1], user_id)
+        return embeds
+
+    def _add_footer_fields(self, embed: discord.Embed, user_id: str):
+        """共通フッター（ユーザー・確認時刻・URL）"""
         embed.add_field(name="👤 ユーザー", value=f"`{user_id}`", inline=True)
         embed.add_field(name="🕐 確認時刻", value=datetime.now().strftime("%H:%M"), inline=True)
         embed.add_field(
@@ -339,125 +2773,272 @@ class CalendarMonitor(commands.Cog):
             value=f"[フリカレを開く](https://freecalend.com/open/mem{user_id}/)", 
             inline=True
         )
+
+    async def _reply_with_schedule(self, ctx, user_id: str, username: str, label: str, build_embeds):
+        """キャッシュを使って予定を返信する（stale-while-revalidate）
+
+        - TTL内のキャッシュ: そのまま返信
+        - stale期間内のキャッシュ: 即座に返信し、裏で取得し直して変化があればメッセージを編集
+        - キャッシュなし: 取得してから返信
+        """
+        entry = self.cache.peek(user_id)
+        if entry and self.cache.is_fresh(entry):
+            await self._send_embeds(ctx, build_embeds(user_id, username, entry.events))
+            return
+
+        retry_at = self.scraper.retry_at(user_id)
+        if retry_at is not None:
+            # 取得を止めている間は、古いキャッシュか保存済みの予定を、古い可能性がある旨を添えて返す
+            events = entry.events if entry else await self.data_manager.run(self.data_manager.load_events, user_id)
+            if events is None:
+                await ctx.send(
+                    f"⏸️ 取得の失敗が続いているため、{username}のページの取得を <t:{int(retry_at)}:R> まで止めています。"
+                )
+                return
+            await ctx.send(
+                f"⏸️ 取得の失敗が続いているため、{username}のページの取得を <t:{int(retry_at)}:R> まで止めています。"
+                "前回取得した予定を表示します（最新でない可能性があります）。"
+            )
+            await self._send_embeds(ctx, build_embeds(user_id, username, events))
+            return
+
+        if entry:
+            replies = await self._send_embeds(ctx, build_embeds(user_id, username, entry.events))
+            refreshed = await self.cache.refresh(user_id, username)
+            if refreshed is not None:
+                if refreshed.events != entry.events:
+                    await self._replace_embeds(ctx, replies, build_embeds(user_id, username, refreshed.events))
+                await self._remember_schedule(user_id, username, refreshed)
+            return
+
+        msg = await ctx.send(f"🔍 {username}の**{label}**を取得中...")
+        refreshed = await self.cache.refresh(user_id, username)
+        await msg.delete()
+        
+        if refreshed is None:
+            await ctx.send(f"❌ {username}のスケジュール取得に失敗しました。ログを確認してください。")
+            return
         
-        await channel.send(embed=embed)
+        await self._send_embeds(ctx, build_embeds(user_id, username, refreshed.events))
+        await self._remember_schedule(user_id, username, refreshed)
+
+    @staticmethod
+    async def _send_embeds(ctx, embeds: List[discord.Embed]) -> list:
+        return [await ctx.send(embeds=batch) for batch in pack_embeds(embeds)]
+
+    @staticmethod
+    async def _replace_embeds(ctx, messages: list, embeds: List[discord.Embed]):
+        """送信済みのメッセージを新しい埋め込みで編集する（過不足はメッセージの追加・削除で調整）"""
+        batches = pack_embeds(embeds)
+        for message, batch in zip(messages, batches):
+            await message.edit(embeds=batch)
+        for batch in batches[len(messages):]:
+            await ctx.send(embeds=batch)
+        for message in messages[len(batches):]:
+            await message.delete()
+
+    async def _remember_schedule(self, user_id: str, username: str, entry: CacheEntry):
+        """コマンドで取得した全予定を前回データとして保存し、変更があれば定期チェックと同じく通知する
+
+        前回データを更新した後の定期チェックでは同じ変更が検出されないため、ここで通知しないと変更が伝わらない。
+        ページが前回と同じなら何もしない。
+        """
+        if entry.unchanged:
+            return
+        changes = await self._record_changes(user_id, entry)
+        if not changes:
+            return
+        logger.info(f"{username}のスケジュールが更新されました。({changes.summary}) [コマンドでの取得]")
+        self._fan_out(user_id, self._build_notification_embeds(username, changes, user_id), self.command_outbox)
+        await self.command_outbox.flush()
+
+    async def _record_changes(self, user_id: str, entry: CacheEntry) -> ScheduleChanges:
+        """前回との差分とページの指紋を記録し、予定が変わっていれば日付別インデックスも差し替える"""
+        with metrics.timer("freecal_stage_seconds", stage="diff"):
+            changes = await self.data_manager.run(
+                self.data_manager.compute_changes, user_id, entry.events, entry.fingerprint
+            )
+        self.scraper.commit_fingerprint(user_id, entry.fingerprint)
+        if changes or user_id not in self.event_index:
+            self.event_index.replace(user_id, entry.events)
+        return changes
 
-    @commands.command(name='check', help="指定ユーザーの【今日の】予定を確認します。")
+    @commands.hybrid_command(name='check', help="指定ユーザーの【今日の】予定を確認します。")
+    @app_commands.describe(target="ユーザー名またはユーザーID")
     async def check_today(self, ctx, *, target: str = None):
         """今日の予定のみを表示"""
         if not target:
             await self._show_user_list(ctx)
             return
 
-        user_id, username = self._find_user(target)
+        user_id, username = await self._resolve_user(ctx, target)
         if not user_id:
-            await ctx.send(f"❌ ユーザー「{target}」が見つかりませんでした。")
-            return
-        
-        msg = await ctx.send(f"🔍 {username}の**今日の予定**を取得中...")
-        
-        # 今日の予定のみを取得
-        schedule_data = await self.scraper.get_schedule(user_id, username, today_only=True)
-        await msg.delete()
-        
-        if schedule_data is None:
-            await ctx.send(f"❌ {username}のスケジュール取得に失敗しました。ログを確認してください。")
             return
         
-        # 今日の予定を表示
-        embed = discord.Embed(
-            title=f"🔥 {username}の【今日の予定】", 
-            color=discord.Color.green(), 
-#            timestamp=datetime.now()
-        )
-        embed.description = schedule_data if schedule_data else "今日の予定はありません。"
-#        embed.add_field(
-#            name="📋 今後の全予定を確認", 
-#            value=f"`!calendar {username}`", 
-#            inline=False
-#        )
-        
-        # フッター情報
-        embed.add_field(name="👤 ユーザー", value=f"`{user_id}`", inline=True)
-        embed.add_field(name="🕐 確認時刻", value=datetime.now().strftime("%H:%M"), inline=True)
-        embed.add_field(
-            name="🔗 URL", 
-            value=f"[フリカレを開く](https://freecalend.com/open/mem{user_id}/)", 
-            inline=True
-        )
-        
-        await ctx.send(embed=embed)
+        await self._reply_with_schedule(ctx, user_id, username, "今日の予定", self._build_today_embeds)
 
-    @commands.command(name='calendar', help="指定ユーザーの【今後の全予定】を表示します。")
+    @commands.hybrid_command(name='calendar', help="指定ユーザーの【今後の全予定】を表示します。")
+    @app_commands.describe(target="ユーザー名またはユーザーID")
     async def show_calendar(self, ctx, *, target: str = None):
         """今後の全予定を表示（従来の!checkの動作）"""
         if not target:
             await self._show_user_list(ctx)
             return
 
-        user_id, username = self._find_user(target)
+        user_id, username = await self._resolve_user(ctx, target)
         if not user_id:
-            await ctx.send(f"❌ ユーザー「{target}」が見つかりませんでした。")
             return
         
-        msg = await ctx.send(f"🔍 {username}の**今後の全予定**を取得中...")
-        
-        # 全予定を取得
-        schedule_data = await self.scraper.get_schedule(user_id, username, today_only=False)
-        await msg.delete()
-        
-        if schedule_data is None:
-            await ctx.send(f"❌ {username}のスケジュール取得に失敗しました。ログを確認してください。")
+        await self._reply_with_schedule(ctx, user_id, username, "今後の全予定", self._build_calendar_embeds)
+
+    @commands.hybrid_command(name='week', help="指定ユーザーの【今日から7日間の】予定を記録から表示します。")
+    @app_commands.describe(target="ユーザー名またはユーザーID")
+    async def show_week(self, ctx, *, target: str = None):
+        """定期チェックで記録済みの予定から今日〜6日後の予定を表示（ページは取得しない）"""
+        if not target:
+            await self._show_user_list(ctx)
             return
-        
-        # データが変更されていれば保存
-        if self.data_manager.has_changed(user_id, schedule_data):
-            self.data_manager.save_all_data()
-        
-        # 全予定を表示
+
+        user_id, username = await self._resolve_user(ctx, target)
+        if not user_id or not await self._ensure_indexed(ctx, user_id, username):
+            return
+
+        today = datetime.now().date()
+        end = today + timedelta(days=WEEK_DAYS - 1)
+        events = self.event_index.between(user_id, today, end)
+        description = format_events(events) if events else "この期間の予定はありません。"
+        await self._send_embeds(ctx, self._build_embeds(
+            f"📆 {username}の【{today:%m/%d}〜{end:%m/%d}の予定】", discord.Color.teal(), description, user_id
+        ))
+
+    @commands.hybrid_command(name='date', help="指定した日の予定を記録から表示します（名前省略時は全員分）。")
+    @app_commands.describe(day="日付（例: 7/15、2025-07-15、明日）", target="ユーザー名またはユーザーID（省略時は全員）")
+    async def show_date(self, ctx, day: str, *, target: str = None):
+        """定期チェックで記録済みの予定から指定日の予定を表示（ページは取得しない）"""
+        event_date = await self._parse_day(ctx, day)
+        if not event_date:
+            return
+        heading = f"{event_date:%m/%d}（{WEEKDAY_LABELS[event_date.weekday()]}）"
+
+        if target:
+            user_id, username = await self._resolve_user(ctx, target)
+            if not user_id or not await self._ensure_indexed(ctx, user_id, username):
+                return
+            events = self.event_index.on(event_date).get(user_id, [])
+            description = format_events(events) if events else "この日の予定はありません。"
+            embeds = self._build_embeds(f"📅 {username}の【{heading}の予定】", discord.Color.green(), description, user_id)
+        else:
+            users = self.data_manager.monitored_users
+            by_user = {uid: events for uid, events in self.event_index.on(event_date).items() if uid in users}
+            sections = [
+                f"**{users[uid]}**\n{format_events(events)}"
+                for uid, events in sorted(by_user.items(), key=lambda item: self.user_index.names[item[0]][1])
+            ]
+            description = "\n\n".join(sections) or "この日に予定のある人はいません。"
+            embeds = self._build_embeds(
+                f"📅 【{heading}の予定】{len(by_user)}人", discord.Color.green(), description, None
+            )
+        await self._send_embeds(ctx, embeds)
+
+    @commands.hybrid_command(name='free', help="指定した日に予定の無い人を記録から表示します。")
+    @app_commands.describe(day="日付（例: 7/15、2025-07-15、明日）")
+    async def show_free(self, ctx, day: str):
+        """全監視ユーザーのうち指定日に予定の無い人を表示（記録済みの予定から判定し、ページは取得しない）"""
+        event_date = await self._parse_day(ctx, day)
+        if not event_date:
+            return
+
+        users = self.data_manager.monitored_users
+        free = self.event_index.free_on(event_date, users)
+        busy = [uid for uid in self.event_index.on(event_date) if uid in users]
+        unknown = [uid for uid in users if uid not in self.event_index]
+
+        def names(user_ids: List[str]) -> List[str]:
+            return sorted((users[uid] for uid in user_ids), key=normalize_name)
+
+        sections = [f"予定なし {len(free)}人 / 予定あり {len(busy)}人 / 未取得 {len(unknown)}人"]
+        sections.append("\n".join(f"✅ **{name}**" for name in names(free)) or "この日に予定の空いている人はいません。")
+        if unknown:
+            sections.append("**❔ 未取得（判定できません）**\n" + "、".join(names(unknown)))
+        await self._send_embeds(ctx, self._build_embeds(
+            f"🈳 【{event_date:%m/%d}（{WEEKDAY_LABELS[event_date.weekday()]}）に予定の無い人】",
+            discord.Color.teal(), "\n\n".join(sections), None
+        ))
+
+    async def _parse_day(self, ctx, text: str) -> Optional[date]:
+        event_date = parse_date_arg(text)
+        if event_date is None:
+            await ctx.send(f"❌ 日付「{text}」を読み取れませんでした。`7/15`・`2025-07-15`・`明日` のように指定してください。")
+        return event_date
+
+    async def _ensure_indexed(self, ctx, user_id: str, username: str) -> bool:
+        """予定が一度も記録されていないユーザーなら案内を返信して False"""
+        if user_id in self.event_index:
+            return True
+        await ctx.send(f"ℹ️ {username}の予定はまだ記録されていません。`!calendar {username}` で取得してください。")
+        return False
+
+    @commands.command(name='history', help="予定の変更履歴を表示します（名前省略時は全員分）。")
+    async def show_history(self, ctx, *, target: str = None):
+        """データベースに記録された変更履歴を新しい順に表示"""
+        user_id = username = None
+        if target:
+            user_id, username = await self._resolve_user(ctx, target)
+            if not user_id:
+                return
+
+        entries = await self.data_manager.run(self.data_manager.get_history, user_id, HISTORY_LIMIT)
         embed = discord.Embed(
-            title=f"⏰ {username}の【今後の全予定】", 
-            color=discord.Color.blue(), 
-#            timestamp=datetime.now()
-        )
-        embed.description = schedule_data[:4000] if schedule_data else "登録されている今後の予定はありません。"
-        
-        # フッター情報
-        embed.add_field(name="👤 ユーザー", value=f"`{user_id}`", inline=True)
-        embed.add_field(name="🕐 確認時刻", value=datetime.now().strftime("%H:%M"), inline=True)
-        embed.add_field(
-            name="🔗 URL", 
-            value=f"[フリカレを開く](https://freecalend.com/open/mem{user_id}/)", 
-            inline=True
+            title=f"📜 {username}の変更履歴" if username else "📜 変更履歴",
+            color=discord.Color.dark_teal(),
         )
-        
+        if not entries:
+            embed.description = "記録されている変更はありません。"
+        else:
+            icons = {"added": "🆕", "removed": "🗑️", "modified": "✏️"}
+            lines = []
+            for entry in entries:
+                name = "" if username else f"**{self.data_manager.monitored_users.get(entry.user_id, entry.user_id)}** "
+                line = f"`{entry.detected_at:%m/%d %H:%M}` {icons.get(entry.change_type, '')} {name}{entry.event.format()}"
+                if entry.old_event:
+                    line += f"\n　（変更前: {entry.old_event.format().removeprefix('🔹 ')}）"
+                lines.append(line)
+            embed.description = "\n".join(lines)[:4000]
+        embed.set_footer(text=f"新しい順に最大{HISTORY_LIMIT}件")
         await ctx.send(embed=embed)
 
-    async def _show_user_list(self, ctx):
-        """監視ユーザー一覧を表示"""
-        users = self.data_manager.monitored_users
+    async def _show_user_list(self, ctx, page: int = 1):
+        """監視ユーザー一覧を表示（ページ送りボタン付き）"""
+        users = self.user_index.search("")
         if not users:
             await ctx.send("監視対象のユーザーが登録されていません。`!adduser`で追加してください。")
             return
         
-        user_list = "\n".join([f"`{uid}`: **{name}**" for uid, name in users.items()])
-        embed = discord.Embed(
-            title="📋 監視ユーザー一覧", 
-            description=user_list, 
-            color=0x0099ff
-        )
-        embed.set_footer(text="使い方: !check [名前] で今日の予定、!calendar [名前] で全予定")
-        await ctx.send(embed=embed)
+        view = UserListView(users, page - 1)
+        if view.pages > 1:
+            await ctx.send(embed=view.build_embed(), view=view)
+        else:
+            await ctx.send(embed=view.build_embed())
 
-    def _find_user(self, target: str) -> Tuple[Optional[str], Optional[str]]:
-        users = self.data_manager.monitored_users
-        if target in users: 
-            return target, users[target]
-        
-        target_lower = target.lower()
-        for uid, name in users.items():
-            if target_lower in name.lower(): 
-                return uid, name
+    @commands.command(name='users', help="監視ユーザー一覧を表示します（ページ番号を指定可能）。")
+    async def list_users(self, ctx, page: int = 1):
+        await self._show_user_list(ctx, page)
+
+    async def _resolve_user(self, ctx, target: str) -> Tuple[Optional[str], Optional[str]]:
+        """名前・IDからユーザーを特定する（見つからない・複数該当する場合は理由を返信して None）"""
+        matches = self.user_index.resolve(target)
+        if len(matches) == 1:
+            return matches[0]
+        if not matches:
+            await ctx.send(f"❌ ユーザー「{target}」が見つかりませんでした。")
+            return None, None
+        lines = [f"`{uid}`: **{name}**" for uid, name in matches[:AMBIGUOUS_LIST_COUNT]]
+        if len(matches) > AMBIGUOUS_LIST_COUNT:
+            lines.append(f"…他 {len(matches) - AMBIGUOUS_LIST_COUNT}人")
+        await ctx.send(
+            f"⚠️ 「{target}」に該当するユーザーが{len(matches)}人います。名前を詳しく指定するか、IDで指定してください。\n"
+            + "\n".join(lines)
+        )
         return None, None
 
     @commands.command(name='status', help="BOTの現在の監視ステータスを表示します。")
@@ -470,27 +3051,195 @@ class CalendarMonitor(commands.Cog):
         )
         status = "🟢 実行中" if self.schedule_check.is_running() else "🔴 停止中"
         embed.add_field(name="定期監視", value=status)
-        
-        if self.schedule_check.is_running() and self.schedule_check.next_iteration:
+        embed.add_field(name="監視ユーザー数", value=f"{len(self.data_manager.monitored_users)}人")
+        embed.add_field(name="チェック待ち", value=f"{len(self.scheduler)}人")
+        hits, misses = self.scraper.fingerprint_hits, self.scraper.fingerprint_misses
+        if hits + misses:
             embed.add_field(
-                name="次回実行", 
-                value=f"<t:{int(self.schedule_check.next_iteration.timestamp())}:R>"
+                name="未変更で解析省略",
+                value=f"{hits}回 / 解析 {misses}回 ({hits / (hits + misses):.0%})",
             )
         
-        embed.add_field(name="監視ユーザー数", value=f"{len(self.data_manager.monitored_users)}人")
-        
-        channel = self.bot.get_channel(self.notification_channel_id) if self.notification_channel_id else None
-        embed.add_field(name="通知チャンネル", value=channel.mention if channel else "未設定")
+        embed.add_field(name="通知チャンネル", value=self._describe_channels(ctx.guild))
+        if self.sharded:
+            leases = await self.data_manager.run(self.data_manager.active_leases)
+            embed.add_field(
+                name="取得ワーカー",
+                value="\n".join(f"`{worker_id}` {count}人チェック中" for worker_id, count in leases.items())
+                or "チェック中のワーカーはありません",
+                inline=False,
+            )
+
+        upcoming = self.scheduler.upcoming(STATUS_UPCOMING_COUNT)
+        if upcoming:
+            lines = []
+            for due, user_id in upcoming:
+                name = self.data_manager.monitored_users.get(user_id, user_id)
+                pin = "📌" if user_id in self.scheduler.pinned else ""
+                hours = self.scheduler.interval_of(user_id) / 3600
+                lines.append(f"<t:{int(due)}:R> **{name}** （間隔 {hours:.1f}時間{pin}）")
+            embed.add_field(name="次回チェック予定", value="\n".join(lines), inline=False)
+
+        if self.scraper.drivers:
+            lines = []
+            for managed in self.scraper.drivers:
+                rss = f"{managed.rss_mb:.0f}MB" if managed.rss_mb is not None else "不明"
+                lines.append(
+                    f"#{managed.number} 稼働 {managed.age / 3600:.1f}時間 / {managed.pages}ページ / メモリ {rss}"
+                )
+            lines.append(f"作り直し {self.scraper.drivers_recycled}回")
+            embed.add_field(name="Chrome", value="\n".join(lines), inline=False)
+        breaker_lines = []
+        site_retry = self.scraper.site_breaker.retry_at(SITE_KEY)
+        if site_retry:
+            failures = self.scraper.site_breaker.failures.get(SITE_KEY, 0)
+            breaker_lines.append(f"🌐 **サイト全体** <t:{int(site_retry)}:R>に再開（{failures}回連続）")
+        stopped_users = self.scraper.user_breaker.open_keys()
+        for until, user_id, failures in stopped_users[:STATUS_UPCOMING_COUNT]:
+            name = self.data_manager.monitored_users.get(user_id, user_id)
+            breaker_lines.append(f"**{name}** <t:{int(until)}:R>に再開（{failures}回連続）")
+        if len(stopped_users) > STATUS_UPCOMING_COUNT:
+            breaker_lines.append(f"…他 {len(stopped_users) - STATUS_UPCOMING_COUNT}人")
+        if breaker_lines:
+            embed.add_field(name="⏸️ 取得停止中", value="\n".join(breaker_lines), inline=False)
+
+        captures = self.scraper.captures
+        if captures.policy != "off":
+            embed.add_field(
+                name="デバッグ保存",
+                value=f"{captures.policy} / {len(captures)}件 {captures.total_bytes / 1024 / 1024:.1f}MB",
+            )
         
         await ctx.send(embed=embed)
 
-    @commands.command(name='setchannel', help="通知チャンネルを設定します。")
+    @commands.command(name='metrics', help="処理時間と取得結果の集計を表示します。")
+    @commands.has_permissions(administrator=True)
+    async def show_metrics(self, ctx):
+        embed = discord.Embed(title="📈 メトリクス", color=0x0099ff)
+
+        def describe(histogram: Histogram) -> str:
+            return f"{histogram.count}回 / 平均 {histogram.mean:.2f}秒 / p95 ≦{histogram.quantile(0.95):g}秒"
+
+        stages = metrics.labelled("freecal_stage_seconds")
+        if stages:
+            embed.add_field(
+                name="処理時間",
+                value="\n".join(f"`{labels['stage']}` {describe(h)}" for labels, h in stages),
+                inline=False,
+            )
+        commands_timed = metrics.labelled("freecal_command_seconds")
+        if commands_timed:
+            embed.add_field(
+                name="コマンド応答時間",
+                value="\n".join(f"`!{labels['command']}` {describe(h)}" for labels, h in commands_timed),
+                inline=False,
+            )
+        startup = {labels['phase']: h for labels, h in metrics.labelled("freecal_startup_seconds")}
+        if startup:
+            embed.add_field(
+                name="起動時間",
+                value=" / ".join(
+                    f"{label} {startup[phase].total:.1f}秒"
+                    for phase, label in (("login", "ログイン"), ("warmup", "事前準備"), ("first_command", "最初の応答"))
+                    if phase in startup
+                ),
+                inline=False,
+            )
+        results = {
+            label: int(metrics.counter("freecal_fetch_total", result=key))
+            for key, label in (("success", "成功"), ("empty", "予定なし"), ("unchanged", "未変更"), ("failure", "失敗"),
+                               ("skipped", "停止中"))
+        }
+        embed.add_field(name="取得結果", value=" / ".join(f"{k} {v}" for k, v in results.items()), inline=False)
+
+        now = time.time()
+        oldest = sorted(
+            (metrics.user_last_success.get(uid, 0), uid) for uid in self.data_manager.monitored_users
+        )[:STATUS_UPCOMING_COUNT]
+        if oldest:
+            lines = []
+            for fetched_at, user_id in oldest:
+                name = self.data_manager.monitored_users.get(user_id, user_id)
+                if fetched_at:
+                    count = metrics.user_events.get(user_id, 0)
+                    lines.append(f"**{name}** {(now - fetched_at) / 3600:.1f}時間前（{count}件）")
+                else:
+                    lines.append(f"**{name}** 未取得")
+            embed.add_field(name="最終取得が古いユーザー", value="\n".join(lines), inline=False)
+
+        if self._metrics_runner:
+            port = getattr(config, 'METRICS_PORT', None)
+            embed.set_footer(text=f"Prometheus: http://{getattr(config, 'METRICS_HOST', '127.0.0.1')}:{port}/metrics")
+        await ctx.send(embed=embed)
+
+    def _describe_channels(self, guild) -> str:
+        """このサーバー内の通知チャンネルと、それぞれが受け取る人数"""
+        counts: Dict[int, int] = {}
+        for channel_ids in self.data_manager.subscriptions.values():
+            for channel_id in channel_ids:
+                counts[channel_id] = counts.get(channel_id, 0) + 1
+        lines = []
+        for channel_id, count in sorted(counts.items()):
+            channel = self.bot.get_channel(channel_id)
+            if channel and guild and getattr(channel, 'guild', None) == guild:
+                default = "⭐" if self.data_manager.default_channels.get(guild.id) == channel_id else ""
+                lines.append(f"{channel.mention}{default} （{count}人）")
+        others = len(counts) - len(lines)
+        if others:
+            lines.append(f"他のサーバー・不明なチャンネル {others}件")
+        return "\n".join(lines) or "未設定"
+
+    def _guild_channels(self, guild, user_id: str) -> List[int]:
+        """このサーバー内にある、ユーザーの通知先チャンネル"""
+        return [
+            channel_id for channel_id in self.data_manager.subscribers(user_id)
+            if getattr(getattr(self.bot.get_channel(channel_id), 'guild', None), 'id', None) == guild.id
+        ]
+
+    def _guild_users(self, guild) -> List[str]:
+        """このサーバーで監視しているユーザー（通知先が1つも無いユーザーを含む。サーバー外の実行では全員）"""
+        users = self.data_manager.monitored_users
+        if guild is None:
+            return list(users)
+        return [
+            user_id for user_id in users
+            if not self.data_manager.subscribers(user_id) or self._guild_channels(guild, user_id)
+        ]
+
+    @commands.command(name='setchannel', help="通知チャンネルを設定します（このサーバーで監視中の全員分の通知を受け取ります）。")
     @commands.has_permissions(administrator=True)
     async def set_notification_channel(self, ctx, channel: discord.TextChannel = None):
         channel = channel or ctx.channel
-        self.notification_channel_id = channel.id
-        config.NOTIFICATION_CHANNEL_ID = channel.id  # メモリ上のconfigも更新
-        await ctx.send(f"✅ 通知チャンネルを {channel.mention} に設定しました。")
+        guild_id = ctx.guild.id if ctx.guild else None
+        if guild_id:
+            await self.data_manager.set_default_channel(guild_id, channel.id)
+        added = await self.data_manager.subscribe(self._guild_users(ctx.guild), channel.id, guild_id)
+        await ctx.send(f"✅ 通知チャンネルを {channel.mention} に設定しました。（新たに {added}人分の通知を登録）")
+
+    @commands.command(name='subscribe', help="指定ユーザーの通知をチャンネルに登録します。")
+    @commands.has_permissions(administrator=True)
+    async def subscribe(self, ctx, target: str, channel: discord.TextChannel = None):
+        channel = channel or ctx.channel
+        user_id, username = await self._resolve_user(ctx, target)
+        if not user_id:
+            return
+        guild_id = ctx.guild.id if ctx.guild else None
+        if await self.data_manager.subscribe([user_id], channel.id, guild_id):
+            await ctx.send(f"✅ **{username}** の通知を {channel.mention} に登録しました。")
+        else:
+            await ctx.send(f"⚠️ **{username}** の通知は既に {channel.mention} に登録されています。")
+
+    @commands.command(name='unsubscribe', help="指定ユーザーの通知をチャンネルから解除します。")
+    @commands.has_permissions(administrator=True)
+    async def unsubscribe(self, ctx, target: str, channel: discord.TextChannel = None):
+        channel = channel or ctx.channel
+        user_id, username = await self._resolve_user(ctx, target)
+        if not user_id:
+            return
+        if await self.data_manager.unsubscribe([user_id], channel.id):
+            await ctx.send(f"✅ **{username}** の通知を {channel.mention} から解除しました。")
+        else:
+            await ctx.send(f"⚠️ **{username}** の通知は {channel.mention} に登録されていません。")
 
     @commands.command(name='adduser', help="監視対象のユーザーを追加します。")
     @commands.has_permissions(administrator=True)
@@ -498,37 +3247,257 @@ class CalendarMonitor(commands.Cog):
         if not user_id.isdigit():
             await ctx.send("❌ ユーザーIDは数字である必要があります。")
             return
+        channel_id = self.data_manager.default_channels.get(ctx.guild.id) if ctx.guild else None
         if user_id in self.data_manager.monitored_users:
-            await ctx.send(f"⚠️ ユーザーID `{user_id}` は既に登録されています。")
+            # 他のサーバーで監視中のカレンダーは取得を共有し、このサーバーの通知チャンネルを追加するだけ
+            if channel_id and await self.data_manager.subscribe([user_id], channel_id, ctx.guild.id):
+                await ctx.send(f"✅ 監視中のユーザーID `{user_id}` の通知を <#{channel_id}> に登録しました。")
+            else:
+                await ctx.send(f"⚠️ ユーザーID `{user_id}` は既に登録されています。")
             return
-        self.data_manager.add_user(user_id, username)
+        await self.data_manager.add_user(user_id, username)
+        self.user_index.add(user_id, username)
+        if channel_id:
+            await self.data_manager.subscribe([user_id], channel_id, ctx.guild.id)
+        self.scheduler.add(user_id)
         await ctx.send(f"✅ **{username}** (ID: `{user_id}`) を監視対象に追加しました。")
 
-    @commands.command(name='removeuser', help="監視対象のユーザーを削除します。")
+    @commands.hybrid_command(name='removeuser', help="監視対象のユーザーを削除します。")
     @commands.has_permissions(administrator=True)
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.describe(target="ユーザー名またはユーザーID")
     async def remove_user(self, ctx, target: str):
-        user_id, username = self._find_user(target)
+        user_id, username = await self._resolve_user(ctx, target)
         if not user_id:
-            await ctx.send(f"❌ ユーザー「{target}」が見つかりませんでした。")
             return
-        if self.data_manager.remove_user(user_id):
+        if ctx.guild is not None:
+            # このサーバーの通知先（と、削除されて見つからないチャンネル）だけを解除し、
+            # 他のサーバーの通知先が残っていれば監視は続ける
+            unreachable = [
+                channel_id for channel_id in self.data_manager.subscribers(user_id)
+                if self.bot.get_channel(channel_id) is None
+            ]
+            for channel_id in self._guild_channels(ctx.guild, user_id) + unreachable:
+                await self.data_manager.unsubscribe([user_id], channel_id)
+            if self.data_manager.subscribers(user_id):
+                await ctx.send(
+                    f"✅ **{username}** (ID: `{user_id}`) のこのサーバーでの通知を解除しました。"
+                    "（他のサーバーで監視中のため、取得は続けます）"
+                )
+                return
+        if await self.data_manager.remove_user(user_id):
+            self.cache.invalidate(user_id)
+            self.scheduler.remove(user_id)
+            self.user_index.remove(user_id)
+            self.event_index.remove(user_id)
+            self.scraper.forget_fingerprint(user_id)
+            self.scraper.user_breaker.forget(user_id)
+            metrics.forget_user(user_id)
             await ctx.send(f"✅ **{username}** (ID: `{user_id}`) を監視対象から削除しました。")
         else:
             await ctx.send(f"❌ ユーザー「{target}」の削除に失敗しました。")
 
+    @commands.command(name='pin', help="ユーザーのチェック間隔を固定します（時間単位）。")
+    @commands.has_permissions(administrator=True)
+    async def pin_user(self, ctx, target: str, hours: float):
+        user_id, username = await self._resolve_user(ctx, target)
+        if not user_id:
+            return
+        if hours <= 0:
+            await ctx.send("❌ 間隔は0より大きい値を指定してください。")
+            return
+        self.scheduler.pin(user_id, hours * 3600)
+        await self._save_schedule_state(user_id)
+        await ctx.send(f"📌 **{username}** のチェック間隔を {hours:g}時間 に固定しました。")
+
+    @commands.command(name='unpin', help="ユーザーのチェック間隔の固定を解除します。")
+    @commands.has_permissions(administrator=True)
+    async def unpin_user(self, ctx, target: str):
+        user_id, username = await self._resolve_user(ctx, target)
+        if not user_id:
+            return
+        self.scheduler.pin(user_id, None)
+        await self._save_schedule_state(user_id)
+        await ctx.send(f"✅ **{username}** のチェック間隔を自動調整に戻しました。")
+
+    @check_today.autocomplete('target')
+    @show_calendar.autocomplete('target')
+    @show_week.autocomplete('target')
+    @show_date.autocomplete('target')
+    @remove_user.autocomplete('target')
+    async def user_autocomplete(self, interaction: discord.Interaction, current: str) -> List[app_commands.Choice[str]]:
+        """スラッシュコマンドのユーザー名補完（候補の値はユーザーID）"""
+        return [
+            app_commands.Choice(name=f"{name} ({uid})"[:100], value=uid)
+            for uid, name in self.user_index.search(current, limit=25)
+        ]
+
+
+class ShardWorker:
+    """取得専用ワーカー（python bot.py --worker）
+
+    共有データベースから、チェック時刻を迎えたユーザーを期限付きで借りて（lease）取得・差分計算を行い、
+    結果を results テーブルに書く。通知は Discord に接続しているプロセスが results を読んで行う。
+    同じデータベースを使うワーカーを増やすほど、同時にチェックできる人数が増える。
+    期限内に返されなかったユーザー（ワーカーが停止した場合など）は、他のワーカーが借り直す。
+    """
+
+    def __init__(self, worker_id: str, drain: bool = False):
+        self.worker_id = worker_id
+        # True なら借りられるユーザーが無くなった時点で終了する（ベンチマーク・cron 用）
+        self.drain = drain
+        self.lease_seconds = getattr(config, 'LEASE_SECONDS', 300)
+        self.batch_size = max(1, getattr(config, 'LEASE_BATCH_SIZE', 10))
+        self.poll_seconds = getattr(config, 'WORKER_POLL_SECONDS', 5)
+        self.data_manager = DataManager(DATABASE_FILE)
+        self.scraper = FreecalendScraper()
+        self.scheduler = create_scheduler()
+        # アクセス頻度の上限は、同じデータベースを使う全ワーカーの合計で守る
+        self.rate_limiter = create_rate_limiter(self.data_manager)
+        self.checked = 0
+
+    async def run(self):
+        logger.info(
+            f"[{self.worker_id}] 取得ワーカーを開始しました"
+            f"（同時取得 {self.scraper.pool_size}件 / {self.batch_size}人ずつ {self.lease_seconds}秒間借ります）"
+        )
+        try:
+            while True:
+                # サイト全体の取得を止めている間はユーザーを借りない（他のワーカーに回す）
+                site_retry = self.scraper.site_breaker.retry_at(SITE_KEY)
+                if site_retry is not None:
+                    if self.drain:
+                        break
+                    await asyncio.sleep(max(0.0, site_retry - time.time()))
+                    continue
+                batch = await self.data_manager.run(
+                    self.data_manager.claim_users, self.worker_id, self.batch_size, self.lease_seconds
+                )
+                if not batch:
+                    if self.drain:
+                        break
+                    await asyncio.sleep(self.poll_seconds)
+                    continue
+                queue: asyncio.Queue = asyncio.Queue()
+                for leased in batch:
+                    queue.put_nowait(leased)
+                await asyncio.gather(*(
+                    self._check_worker(queue) for _ in range(min(self.scraper.pool_size, len(batch)))
+                ))
+        finally:
+            await self.data_manager.run(self.data_manager.release_leases, self.worker_id)
+            await self.scraper.close()
+            self.data_manager.close()
+            logger.info(f"[{self.worker_id}] 取得ワーカーを終了しました（{self.checked}人をチェック）")
+
+    async def _check_worker(self, queue: asyncio.Queue):
+        while True:
+            try:
+                leased: LeasedUser = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            renewed = await self.data_manager.run(
+                self.data_manager.renew_lease, leased.user_id, self.worker_id, self.lease_seconds
+            )
+            if not renewed:
+                logger.warning(f"[{self.worker_id}] {leased.username} の貸し出し期限が切れたため、他のワーカーに任せます。")
+                continue
+            # 取得を止めている間はアクセス枠を使わずに延期する（_check_worker と同じ）
+            retry_at = self.scraper.retry_at(leased.user_id)
+            if retry_at is None:
+                await self.rate_limiter.acquire()
+                retry_at = self.scraper.retry_at(leased.user_id)
+            if retry_at is not None:
+                await self._finish(leased, "skipped", None, retry_at)
+                if self.scraper.site_breaker.retry_at(SITE_KEY) is not None:
+                    while not queue.empty():
+                        leased = queue.get_nowait()
+                        await self._finish(leased, "skipped", None, self.scraper.retry_at(leased.user_id) or retry_at)
+                continue
+            status, changes = "failed", None
+            try:
+                status, changes = await self._check(leased)
+            except Exception as e:
+                logger.error(f"[{self.worker_id}] {leased.username}のチェック中にエラー: {e}", exc_info=True)
+            await self._finish(leased, status, changes)
+
+    async def _check(self, leased: LeasedUser) -> Tuple[str, Optional[ScheduleChanges]]:
+        user_id, username = leased.user_id, leased.username
+        # 他のワーカーが先に記録している場合があるため、前回の予定とページの指紋は借りた時点の記録を使う
+        previous = await self.data_manager.run(self.data_manager.load_events, user_id)
+        if leased.fingerprint:
+            self.scraper.fingerprints[user_id] = leased.fingerprint
+        else:
+            self.scraper.fingerprints.pop(user_id, None)
+        result = await self.scraper.fetch_events(user_id, username, previous)
+        if result is None:
+            return "failed", None
+        if result.unchanged:
+            return "unchanged", None
+        with metrics.timer("freecal_stage_seconds", stage="diff"):
+            changes = await self.data_manager.run(
+                self.data_manager.compute_changes, user_id, result.events, result.fingerprint
+            )
+        self.scraper.commit_fingerprint(user_id, result.fingerprint)
+        if not changes:
+            return "unchanged", None
+        logger.info(f"[{self.worker_id}] {username}のスケジュールが更新されました。({changes.summary})")
+        return "changed", changes
+
+    async def _finish(self, leased: LeasedUser, status: str, changes: Optional[ScheduleChanges],
+                      retry_at: Optional[float] = None):
+        """結果を書いて貸し出しを返す（retry_at があれば間隔は変えずにその時刻まで延期）"""
+        user_id = leased.user_id
+        self.scheduler.add(user_id, leased.interval, leased.pinned)
+        if retry_at is None:
+            changed = {"changed": True, "unchanged": False}.get(status)
+            next_due = self.scheduler.reschedule(user_id, changed)
+        else:
+            next_due = retry_at
+        interval = self.scheduler.intervals[user_id]
+        self.scheduler.remove(user_id)
+        self.scraper.dirty_fingerprints.discard(user_id)
+        finished = await self.data_manager.run(
+            self.data_manager.finish_lease, user_id, self.worker_id, interval, next_due,
+            self.scraper.fingerprints.get(user_id), status, changes,
+        )
+        if not finished:
+            logger.warning(f"[{self.worker_id}] {leased.username} は他のワーカーに借り直されていたため、結果を破棄しました。")
+            return
+        self.checked += 1
+
+
+def run_worker(worker_id: str, drain: bool = False):
+    try:
+        asyncio.run(ShardWorker(worker_id, drain).run())
+    except KeyboardInterrupt:
+        pass
+
 
 # BOT本体
 intents = discord.Intents.default()
 intents.message_content = True
-bot = commands.Bot(command_prefix='!', intents=intents)
+# ステータスは接続（再接続を含む）のたびに送られる
+bot = commands.Bot(
+    command_prefix='!', intents=intents,
+    activity=discord.Activity(type=discord.ActivityType.watching, name="フリカレ")
+)
 
 @bot.event
 async def on_ready():
+    # on_ready は再接続のたびに呼ばれるため、Cog の登録とコマンドの同期は初回だけ行う
+    if bot.get_cog(CalendarMonitor.__cog_name__) is not None:
+        logger.info(f'🔄 {bot.user}として再接続しました')
+        return
     logger.info(f'🤖 {bot.user}としてログインしました')
+    record_startup("login", "ログイン")
     await bot.add_cog(CalendarMonitor(bot))
-    await bot.change_presence(
-        activity=discord.Activity(type=discord.ActivityType.watching, name="フリカレ")
-    )
+    if getattr(config, 'SYNC_APP_COMMANDS', True):
+        try:
+            synced = await bot.tree.sync()
+            logger.info(f"スラッシュコマンドを {len(synced)}件 同期しました。")
+        except discord.HTTPException as e:
+            logger.error(f"スラッシュコマンドの同期に失敗しました: {e}")
     logger.info('⚙️ CalendarMonitor Cogをロードしました。監視を開始します。')
 
 @bot.event
@@ -544,15 +3513,22 @@ async def on_command_error(ctx, error):
         await ctx.send(f"❌ エラーが発生しました: {error}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="フリカレ監視BOT")
+    parser.add_argument("--worker", action="store_true",
+                        help="Discord に接続せず、共有データベースのユーザーを取得する取得ワーカーとして動かす")
+    parser.add_argument("--worker-id", default=f"{socket.gethostname()}-{os.getpid()}",
+                        help="取得ワーカーの識別名（ログと貸し出しの記録に使用）")
+    parser.add_argument("--drain", action="store_true",
+                        help="取得ワーカー: チェック待ちのユーザーが無くなったら終了する")
+    args = parser.parse_args()
+    if args.worker:
+        run_worker(args.worker_id, args.drain)
+        exit(0)
+
     if not config.DISCORD_BOT_TOKEN or config.DISCORD_BOT_TOKEN == "YOUR_DISCORD_BOT_TOKEN_HERE":
         logger.error("❌ config.pyにDiscord BOTトークンが設定されていません。")
         exit(1)
     
-    if not os.path.exists(USERS_FILE):
-        with open(USERS_FILE, 'w') as f: 
-            json.dump({}, f)
-        logger.info(f"{USERS_FILE} を作成しました。")
-        
     try:
         bot.run(config.DISCORD_BOT_TOKEN)
     except Exception as e:
@@ -5,10 +5,125 @@
 DISCORD_BOT_TOKEN = "YOUR_DISCORD_BOT_TOKEN_HERE"
 
 # 通知先チャンネルID（Discordで右クリック→IDをコピー）
+# 初回起動時に全員分の通知先として取り込みます。以降は !setchannel / !subscribe で管理します
 NOTIFICATION_CHANNEL_ID = None  # ここを実際のチャンネルIDに変更 ""不要
 
 # チェック間隔設定（時間）
+# ユーザーごとの初期値。変更が多いユーザーは短く、少ないユーザーは長く自動調整されます
 CHECK_INTERVAL_HOURS = 6
+CHECK_INTERVAL_MIN_HOURS = 1
+CHECK_INTERVAL_MAX_HOURS = 24
 
-# アクセス間隔（秒）- robots.txtに配慮して30秒以上推奨
-ACCESS_INTERVAL_SECONDS = 30
\ No newline at end of file
+# チェック時刻の揺らぎ（0.1 = ±10%）。アクセスが同じ時刻に集中しないよう分散します
+CHECK_INTERVAL_JITTER = 0.1
+
+# チェック時刻を迎えたユーザーを確認する間隔（秒）
+SCHEDULER_TICK_SECONDS = 60
+
+# 同時に取得処理を行うワーカー数（Seleniumの場合はChromeの最大起動数）
+SCRAPER_POOL_SIZE = 3
+
+# フリカレへのアクセス頻度制限（全ワーカー合計）
+# 1分あたりの最大アクセス数と、連続で許可するアクセス数
+# ※ 取得ワーカー（python bot.py --worker）は、同じデータベースを使う全ワーカープロセスの合計でこの上限を守ります
+# ※ 旧設定 ACCESS_INTERVAL_SECONDS のみが書かれている場合は、その間隔から換算します
+# ※ フリカレの robots.txt はアクセス間隔30秒以上を求めています。既定値（2回/分・連続1回）より上げる場合は
+#   自己責任で明示的に設定してください
+RATE_LIMIT_PER_MINUTE = 2
+RATE_LIMIT_BURST = 1
+
+# スケジュール取得方式
+# "http": 軽量HTTPで取得し、ccexp要素が無ければSeleniumに自動フォールバック（推奨）
+# "selenium": 常にヘッドレスChromeで取得（従来の動作）
+FETCH_BACKEND = "http"
+
+# フリカレのベースURL（ローカルのスタブサーバーで動作確認する場合のみ変更）
+FREECALEND_BASE_URL = "https://freecalend.com"
+
+# HTTP取得のタイムアウト（秒）と最大同時接続数
+HTTP_TIMEOUT_SECONDS = 15
+HTTP_POOL_SIZE = 4
+
+# 予定キャッシュ（分）
+# TTL内は !check / !calendar をキャッシュから即答し、
+# STALE期間内は古いキャッシュで即答した後に取得し直して、変化があればメッセージを更新します
+SCHEDULE_CACHE_TTL_MINUTES = 10
+SCHEDULE_CACHE_STALE_MINUTES = 720
+
+# Chromeの読み込み設定
+# PAGE_LOAD_STRATEGY: "eager"（DOM構築完了で次へ）/ "normal"（全リソース読み込みまで待つ）
+# BLOCK_PAGE_RESOURCES: 画像・メディア・フォント・広告トラッカーを読み込まない
+# PAGE_SETTLE_MAX_SECONDS: ccexp 要素が出揃うのを待つ最大秒数
+PAGE_LOAD_STRATEGY = "eager"
+BLOCK_PAGE_RESOURCES = True
+PAGE_SETTLE_MAX_SECONDS = 3
+
+# Chromeの作り直し（長時間稼働によるメモリ増加・クラッシュ対策）
+# DRIVER_MAX_PAGES: この数のページを読み込んだChromeは作り直す（0で無効）
+# DRIVER_MAX_RSS_MB: メモリ使用量がこの値（MB）を超えたChromeは作り直す（0で無効・psutilが必要）
+DRIVER_MAX_PAGES = 200
+DRIVER_MAX_RSS_MB = 1024
+
+# HTML解析方式: "lxml"（ccexp要素のみを抽出・高速）/ "bs4"（ページ全体を解析・従来の動作）
+HTML_PARSER = "lxml"
+
+# HTML解析に使うスレッド数（イベントループとは別のスレッドで解析します）
+PARSE_WORKERS = 2
+
+# イベントループがこの秒数以上止まった場合に警告をログ出力
+LOOP_LAG_WARN_SECONDS = 0.25
+
+# メトリクス（Prometheus 形式）の公開ポート（None で無効）
+# 有効にすると http://METRICS_HOST:METRICS_PORT/metrics で取得できます
+METRICS_PORT = None
+METRICS_HOST = "127.0.0.1"
+
+# 通知の送信（1回のチェック分をまとめて、1メッセージ最大10件の埋め込みで送信します）
+# NOTIFY_RATE_PER_MINUTE / NOTIFY_RATE_BURST: 1分あたりの送信数と連続送信できる数
+# NOTIFY_MAX_RETRIES: レート制限・サーバーエラー時の再送回数
+NOTIFY_RATE_PER_MINUTE = 30
+NOTIFY_RATE_BURST = 5
+NOTIFY_MAX_RETRIES = 3
+
+# 起動時にスラッシュコマンド（/check・/calendar・/removeuser）を Discord に同期するか
+SYNC_APP_COMMANDS = True
+
+# chromedriver のパス（None なら初回に webdriver-manager で取得し、chromedriver_path.txt に保存して再利用）
+CHROMEDRIVER_PATH = None
+
+# ログイン直後に先に起動しておく Chrome の台数（0 で起動しない。http では接続だけ準備）
+WARMUP_DRIVERS = 1
+
+# 取得ワーカーの分散（python bot.py --worker で取得専用のプロセスを起動します）
+# SHARDED_WORKERS = True にすると、Discord に接続するプロセスは自分では取得せず、ワーカーの結果を通知するだけになります
+# LEASE_SECONDS: ワーカーが借りたユーザーを他のワーカーに渡さない時間（秒）。期限切れは他のワーカーが借り直します
+# LEASE_BATCH_SIZE: ワーカーが一度に借りる人数 / WORKER_POLL_SECONDS: 借りるユーザーが無いときの待ち時間（秒）
+SHARDED_WORKERS = False
+LEASE_SECONDS = 300
+LEASE_BATCH_SIZE = 10
+WORKER_POLL_SECONDS = 5
+
+# デバッグ用スクリーンショットの保存（screenshots/）
+# SCREENSHOT_POLICY: off / errors（失敗時のみ）/ sampled（失敗時＋SCREENSHOT_SAMPLE_RATE の割合）/ always（毎回）
+# SCREENSHOT_FORMAT: Chromeでのアクセス失敗時の保存形式。png（画面）/ html（ページHTMLを gzip 圧縮して保存。描画しないので軽い）
+#   正常に取得できたページ（sampled / always）は、形式によらず取得済みのHTMLを保存します（取得を遅らせません）
+#   png の画面は取得処理の中で描画するため、その分だけ失敗時の処理が遅くなります
+# SCREENSHOT_MAX_MB / SCREENSHOT_MAX_AGE_DAYS: 合計サイズ・保存期間の上限（超えた分は古いものから削除）
+SCREENSHOT_POLICY = "errors"
+SCREENSHOT_SAMPLE_RATE = 0.05
+SCREENSHOT_FORMAT = "png"
+SCREENSHOT_MAX_MB = 200
+SCREENSHOT_MAX_AGE_DAYS = 7
+
+# 取得失敗時のサーキットブレーカー（続けて失敗する取得先を一定時間止める）
+# USER_BREAKER_THRESHOLD: 同じユーザーの取得に何回続けて失敗したら、そのユーザーの取得を止めるか
+# SITE_BREAKER_THRESHOLD: ユーザーを問わず何回続けて失敗（または遅延）したら、フリカレへの取得を全体で止めるか
+# BREAKER_BASE_MINUTES: 最初に止める時間（分）。止めた後も失敗が続くたびに倍になる（±20%の揺らぎあり）
+# BREAKER_MAX_MINUTES / SITE_BREAKER_MAX_MINUTES: ユーザーごと・サイト全体で止める時間の上限（分）
+# BREAKER_SLOW_SECONDS: 取得にこの秒数以上かかった場合は、成功してもサイトの不調として数える
+USER_BREAKER_THRESHOLD = 3
+SITE_BREAKER_THRESHOLD = 5
+BREAKER_BASE_MINUTES = 5
+BREAKER_MAX_MINUTES = 360
+SITE_BREAKER_MAX_MINUTES = 60
+BREAKER_SLOW_SECONDS = 20
\ No newline at end of file